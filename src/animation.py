@@ -0,0 +1,91 @@
+'''
+Time based playback of queued moves.
+
+Moves wait in a FIFO queue and each one turns for 1 / turns_per_second
+seconds of real time. update(delta_time) advances by the time that really
+passed, finishing as many moves as fit, so a slow or dropped frame never
+slows the logical move rate, it only skips intermediate angles.
+'''
+
+from collections import deque
+
+from cube import CCW, HALF
+
+DEFAULT_TURNS_PER_SECOND = 3.5
+
+
+class MovePlayer:
+    '''
+    Plays move codes (see cube.py) one after another. directions[side] is
+    the sign of the layer angle that makes a clockwise turn of that side on
+    screen.
+    '''
+
+    def __init__(self, directions, turns_per_second=DEFAULT_TURNS_PER_SECOND):
+        self.directions = directions
+        self.turns_per_second = turns_per_second
+        self.queue = deque()
+        self.current = None
+        # fraction of the current move already shown, 0 .. 1
+        self.progress = 0.0
+
+    @property
+    def busy(self):
+        return self.current is not None or bool(self.queue)
+
+    def __len__(self):
+        ''' moves still to finish, including the one turning '''
+        return len(self.queue) + (self.current is not None)
+
+    def push(self, move):
+        self.queue.append(move)
+        if self.current is None:
+            self._next()
+
+    def extend(self, moves):
+        for move in moves:
+            self.push(move)
+
+    def _next(self):
+        self.current = self.queue.popleft() if self.queue else None
+        self.progress = 0.0
+
+    def update(self, delta_time):
+        ''' advance by delta_time seconds, returns the moves that finished '''
+        done = []
+        if self.current is None:
+            return done
+        self.progress += delta_time * self.turns_per_second
+        while self.current is not None and self.progress >= 1.0:
+            done.append(self.current)
+            left = self.progress - 1.0
+            self._next()
+            if self.current is not None:
+                self.progress = left
+        return done
+
+    def skip_to_end(self):
+        ''' finish everything at once, returns the moves to apply '''
+        done = []
+        while self.current is not None:
+            done.append(self.current)
+            self._next()
+        return done
+
+    def cancel(self):
+        ''' drop the queue and the turn in progress without applying them '''
+        self.queue.clear()
+        self.current = None
+        self.progress = 0.0
+
+    def layers(self):
+        ''' [(side, degrees)] of the turning layer, for ProjectionCache '''
+        if self.current is None:
+            return []
+        side, turn = divmod(self.current, 3)
+        degrees = 90 * self.directions[side] * self.progress
+        if turn == CCW:
+            degrees = -degrees
+        elif turn == HALF:
+            degrees *= 2
+        return [(side, degrees)]
@@ -0,0 +1,173 @@
+'''
+Fixed record binary archive of cube states.
+
+    header   64 bytes: magic, version, max_moves, record size
+    records  packed state (3 little endian uint64 words, see packed.py),
+             move count, max_moves move codes
+
+Writers stream records to disk, readers memory map the file and hand out
+records or NumPy chunks without copying. The session.cube text format is
+still read and written through read_session / write_session.
+'''
+
+import struct
+
+import numpy as np
+
+import packed
+from cube import CubeState
+
+MAGIC = b'RCARCHV1'
+VERSION = 1
+HEADER_SIZE = 64
+_header = struct.Struct('<8sHHI')
+_WORD = (1 << 63) - 1
+
+
+def record_dtype(max_moves):
+    fields = [('state', '<u8', (3,)), ('nmoves', 'u1')]
+    if max_moves:
+        fields.append(('moves', 'u1', (max_moves,)))
+    return np.dtype(fields)
+
+
+def read_session(path='session.cube'):
+    ''' stickers of a session.cube style text file '''
+    with open(path) as file:
+        return CubeState.from_config(file.read().split()).stickers
+
+
+def write_session(stickers, path='session.cube'):
+    with open(path, 'w') as file:
+        for line in CubeState(stickers).to_config():
+            file.write(line)
+            file.write('\n')
+
+
+class ArchiveWriter:
+    ''' Streams states (and optional move sequences) into an archive. '''
+
+    def __init__(self, path, max_moves=0, buffer_records=65536):
+        # a record counts its moves in one byte
+        if not 0 <= max_moves <= 255:
+            raise ValueError('max_moves is 0 .. 255, got %d' % max_moves)
+        self.dtype = record_dtype(max_moves)
+        self.max_moves = max_moves
+        self.file = open(path, 'wb')
+        header = _header.pack(MAGIC, VERSION, max_moves, self.dtype.itemsize)
+        self.file.write(header.ljust(HEADER_SIZE, b'\0'))
+        self.buffer = np.zeros(buffer_records, dtype=self.dtype)
+        self.used = 0
+        self.count = 0
+
+    def write(self, stickers, moves=()):
+        if len(moves) > self.max_moves:
+            raise ValueError('at most %d moves per record' % self.max_moves)
+        if self.used == len(self.buffer):
+            self.flush()
+        record = self.buffer[self.used]
+        value = packed.pack(stickers)
+        record['state'] = (value & _WORD, value >> 63 & _WORD, value >> 126)
+        record['nmoves'] = len(moves)
+        if self.max_moves:
+            record['moves'][:len(moves)] = moves
+        self.used += 1
+        self.count += 1
+
+    def write_many(self, states, moves=None, nmoves=None):
+        '''
+        Append (N, 54) states, with optional (N, K) move codes and (N,)
+        move counts (K when left out).
+        '''
+        states = np.asarray(states, dtype=np.uint8)
+        self.flush()
+        records = np.zeros(len(states), dtype=self.dtype)
+        records['state'] = packed.pack_many(states)
+        if moves is not None:
+            moves = np.asarray(moves, dtype=np.uint8)
+            if moves.shape[1] > self.max_moves:
+                raise ValueError('at most %d moves per record' %
+                                 self.max_moves)
+            records['moves'][:, :moves.shape[1]] = moves
+            records['nmoves'] = moves.shape[1] if nmoves is None else nmoves
+        records.tofile(self.file)
+        self.count += len(states)
+
+    def flush(self):
+        if self.used:
+            self.buffer[:self.used].tofile(self.file)
+            self.used = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    ''' Memory mapped, random access view of an archive. '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            magic, version, max_moves, size = _header.unpack(
+                file.read(_header.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a cube archive' % path)
+        self.max_moves = max_moves
+        self.dtype = record_dtype(max_moves)
+        if self.dtype.itemsize != size:
+            raise ValueError('%s has a broken header' % path)
+        raw = np.memmap(path, dtype=np.uint8, mode='r')
+        # a torn last record from an interrupted writer is ignored
+        count = (len(raw) - HEADER_SIZE) // size
+        self.records = raw[HEADER_SIZE:HEADER_SIZE + count * size].view(
+            self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        ''' (stickers, moves) of record i '''
+        r = self.records[i]
+        state = packed.to_int(r['state'])
+        moves = bytes(r['moves'][:r['nmoves']]) if self.max_moves else b''
+        return packed.unpack(state), moves
+
+    def states(self, start=0, stop=None):
+        ''' (n, 54) sticker array of a record range '''
+        return packed.unpack_many(self.records['state'][start:stop])
+
+    def chunks(self, size=65536):
+        '''
+        Yield (states, moves, nmoves) arrays of up to size records. moves
+        and nmoves are views into the map; moves is None without moves.
+        '''
+        for start in range(0, len(self.records), size):
+            block = self.records[start:start + size]
+            moves = block['moves'] if self.max_moves else None
+            yield packed.unpack_many(block['state']), moves, block['nmoves']
+
+    def __iter__(self):
+        for i in range(len(self.records)):
+            yield self[i]
+
+
+def import_sessions(paths, archive_path):
+    ''' bundle session.cube style files into a new archive '''
+    with ArchiveWriter(archive_path) as writer:
+        for path in paths:
+            writer.write(read_session(path))
+        return writer.count
+
+
+def export_session(archive_path, index, path='session.cube'):
+    ''' write one archived state out as session.cube text '''
+    stickers, moves = ArchiveReader(archive_path)[index]
+    write_session(stickers, path)
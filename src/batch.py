@@ -0,0 +1,97 @@
+'''
+Batched move application over many cube states with NumPy.
+
+States are rows of an (N, 54) uint8 array in the flat CubeState layout
+(side * 9 + face), so row.reshape(6, 9) is exactly Game.cubepiece.
+'''
+
+import numpy as np
+
+from cube import MOVES, NUM_MOVES, SOLVED, compose
+
+# MOVE_TABLE[m] is the gather permutation of move m
+MOVE_TABLE = np.array(MOVES, dtype=np.intp)
+
+
+def solved(n):
+    return np.tile(np.frombuffer(SOLVED, dtype=np.uint8), (n, 1))
+
+
+def from_configs(configurations):
+    ''' stack set_cube style configurations into an (N, 54) array '''
+    text = ''.join(''.join(c) for c in configurations)
+    states = np.frombuffer(text.encode('ascii'), dtype=np.uint8) - ord('0')
+    return states.reshape(-1, 54)
+
+
+def to_configs(states):
+    digits = (np.asarray(states, dtype=np.uint8) + ord('0')).tobytes()
+    digits = digits.decode('ascii')
+    return [[digits[i + s * 9:i + s * 9 + 9] for s in range(6)]
+            for i in range(0, len(digits), 54)]
+
+
+def sequence_permutation(moves):
+    ''' one gather permutation for a whole move sequence '''
+    perm = tuple(range(54))
+    for m in moves:
+        perm = compose(perm, MOVES[m])
+    return np.array(perm, dtype=np.intp)
+
+
+def apply_move(states, move, out=None):
+    ''' apply the same move to every row '''
+    return np.take(states, MOVE_TABLE[move], axis=1, out=out)
+
+
+def apply_sequence(states, moves, out=None):
+    ''' apply a move sequence to every row with a single gather '''
+    return np.take(states, sequence_permutation(moves), axis=1, out=out)
+
+
+def apply_moves(states, moves):
+    ''' apply moves[i] to row i, in place '''
+    moves = np.asarray(moves)
+    if moves.shape != (len(states),):
+        raise ValueError('need one move per state')
+    # one gather per distinct move keeps the index array small even for
+    # millions of rows
+    for m in range(NUM_MOVES):
+        rows = np.flatnonzero(moves == m)
+        if len(rows):
+            states[rows] = states[rows][:, MOVE_TABLE[m]]
+    return states
+
+
+def apply_move_rows(states, move_rows):
+    ''' apply the (N, K) move_rows to the matching states, column by column '''
+    for column in np.asarray(move_rows).T:
+        apply_moves(states, column)
+    return states
+
+
+class CubeBatch:
+    ''' N cube states held as one (N, 54) uint8 array. '''
+
+    def __init__(self, states):
+        if isinstance(states, int):
+            states = solved(states)
+        self.states = np.ascontiguousarray(states, dtype=np.uint8)
+        if self.states.ndim != 2 or self.states.shape[1] != 54:
+            raise ValueError('states must be shaped (N, 54)')
+
+    def __len__(self):
+        return len(self.states)
+
+    def apply(self, move):
+        ''' one move for all rows, or one move per row '''
+        if np.ndim(move) == 0:
+            self.states = apply_move(self.states, move)
+        else:
+            apply_moves(self.states, move)
+
+    def apply_sequence(self, moves):
+        self.states = apply_sequence(self.states, moves)
+
+    def faces(self, i):
+        return self.states[i].reshape(6, 9).tolist()
@@ -0,0 +1,360 @@
+'''
+Solve many states on a process pool, streaming the results as JSON lines.
+
+    python batchsolve.py INPUT [-o solutions.jsonl] [--workers N]
+                         [--chunk 64] [--max-length 22] [--resume]
+
+INPUT is a cube archive (archive.py) or text holding states as 54 digits,
+on one line or as the six 9 digit lines of session.cube. Every output line
+is one state, in input order:
+
+    {"index": 0, "moves": ["3cw", ...], "length": 19, "ms": 12.3}
+
+or {"index": 0, "error": "..."} for a state that cannot be read or solved.
+Lines are flushed as they are written, so a stopped run leaves at most a
+partial last line, which --resume cuts off.
+
+Every worker memory maps the same table file, so the tables sit in memory
+once however many workers run. If a worker dies, the pool is restarted and
+the unfinished chunks are solved again one at a time; a state that kills
+a worker on its own is reported as an error. Finished results are
+never lost. With --resume an existing output is kept and solving continues
+after its last line. With --cache solutions are looked up in and added to
+a solution cache (solvecache.py) shared by all workers.
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import archive
+import solver
+import solvecache
+from cube import move_name
+
+DEFAULT_CHUNK = 64
+
+
+def read_states(path, skip=0):
+    '''
+    yield (index, stickers) of every state in a text or archive file; a
+    text line that is not made of colors 0 .. 5 counts as one state and
+    comes as (index, message), to be reported as that state's error
+    '''
+    with open(path, 'rb') as file:
+        is_archive = file.read(len(archive.MAGIC)) == archive.MAGIC
+    if is_archive:
+        reader = archive.ArchiveReader(path)
+        for start in range(skip, len(reader), 65536):
+            states = reader.states(start, start + 65536)
+            for offset, row in enumerate(states):
+                yield start + offset, row.tobytes()
+        return
+
+    index = 0
+    digits = ''
+    with open(path, errors='replace') as file:
+        for number, line in enumerate(file, 1):
+            text = ''.join(line.split())
+            if text.strip('012345'):
+                # the bad line replaces any state it interrupted
+                if index >= skip:
+                    yield index, 'bad input on line %d' % number
+                index += 1
+                digits = ''
+                continue
+            digits += text
+            while len(digits) >= 54:
+                state, digits = digits[:54], digits[54:]
+                if index >= skip:
+                    yield index, bytes(int(d) for d in state)
+                index += 1
+    if digits and index >= skip:
+        yield index, 'partial state at the end of the input'
+
+
+_solver = None
+_cache = None
+
+
+def _init_worker(table_path, cache_path=None, improve_seconds=0.0):
+    global _solver, _cache
+    _solver = solver.Solver(solver.load_tables(table_path),
+                            improve_seconds=improve_seconds)
+    if cache_path:
+        _cache = solvecache.SolutionCache(cache_path)
+
+
+def _solve_chunk(job):
+    items, max_length = job
+    results = []
+    for index, stickers in items:
+        if isinstance(stickers, str):
+            results.append({'index': index, 'error': stickers})
+            continue
+        began = time.perf_counter()
+        try:
+            if _cache is None:
+                moves = _solver.solve_stickers(stickers, max_length)
+            else:
+                moves = _cache.solve(_solver, stickers, max_length)
+        except ValueError as e:
+            results.append({'index': index, 'error': str(e)})
+            continue
+        results.append({
+            'index': index,
+            'moves': [move_name(m) for m in moves],
+            'length': len(moves),
+            'ms': round((time.perf_counter() - began) * 1000, 3),
+        })
+    return results
+
+
+def _chunks(states, size):
+    chunk = []
+    for item in states:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def solve_stream(states, workers=None, chunk=DEFAULT_CHUNK,
+                 max_length=solver.DEFAULT_MAX_LENGTH,
+                 table_path=solver.default_table_path, cache_path=None,
+                 improve_seconds=0.0):
+    '''
+    Solve (index, stickers) pairs, yielding result dicts in input order.
+    At most a few chunks per worker are in flight, so any number of states
+    streams through in constant memory. With cache_path the workers share
+    a solution cache (solvecache.py). improve_seconds is passed on to
+    the workers' Solver.
+    '''
+    workers = workers or os.cpu_count() or 1
+    # build the tables here once rather than in every worker
+    solver.get_tables(table_path)
+    window = workers * 4
+
+    def start_pool():
+        return ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(table_path, cache_path,
+                                             improve_seconds))
+
+    source = enumerate(_chunks(states, chunk))
+    jobs = {}       # chunk number -> items, until its results are out
+    # a task is (chunk number, None) for a whole chunk or (chunk number,
+    # position) for one item of it
+    running = {}    # future -> task
+    # after a crash the lost tasks run one at a time to find the culprit
+    suspects = deque()
+    partial = {}    # chunk number -> item results of a chunk run item-wise
+    done = {}       # chunk number -> results, waiting for their turn
+    next_out = 0
+    exhausted = False
+    pool = start_pool()
+
+    def submit(task):
+        number, position = task
+        items = jobs[number]
+        if position is not None:
+            items = items[position:position + 1]
+        running[pool.submit(_solve_chunk, (items, max_length))] = task
+
+    def finish(task, results):
+        number, position = task
+        if position is None:
+            done[number] = results
+            return
+        slots = partial[number]
+        slots[position] = results[0]
+        if None not in slots:
+            done[number] = partial.pop(number)
+
+    try:
+        while True:
+            if suspects:
+                if not running:
+                    submit(suspects[0])
+            else:
+                while not exhausted and len(running) < window:
+                    try:
+                        number, items = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    jobs[number] = items
+                    submit((number, None))
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            lost = []
+            for future in finished:
+                task = running.pop(future)
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    lost.append(task)
+                    continue
+                if suspects and suspects[0] == task:
+                    suspects.popleft()
+                finish(task, results)
+            if lost:
+                lost += running.values()
+                running = {}
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = start_pool()
+                if suspects and lost == [suspects[0]]:
+                    # ran alone and still crashed: this is the culprit
+                    number, position = suspects.popleft()
+                    if position is None:
+                        partial[number] = [None] * len(jobs[number])
+                        suspects.extendleft(
+                            (number, p)
+                            for p in reversed(range(len(jobs[number]))))
+                    else:
+                        index = jobs[number][position][0]
+                        finish((number, position),
+                               [{'index': index, 'error': 'worker crashed'}])
+                else:
+                    suspects.extend(sorted(set(lost) - set(suspects),
+                                           key=lambda t: (t[0], t[1] or 0)))
+
+            while next_out in done:
+                del jobs[next_out]
+                for result in done.pop(next_out):
+                    yield result
+                next_out += 1
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Progress:
+    ''' throughput and ETA on stderr, at most once a second '''
+
+    def __init__(self, total=None, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.count = 0
+        self.began = self.shown = time.perf_counter()
+
+    def step(self, count=1):
+        self.count += count
+        now = time.perf_counter()
+        if now - self.shown >= 1:
+            self.shown = now
+            self.show(now)
+
+    def show(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.began
+        rate = self.count / elapsed if elapsed else 0.0
+        text = '%d solved, %.1f/s' % (self.count, rate)
+        if self.total and rate:
+            left = (self.total - self.count) / rate
+            text += ', %.1f%%, eta %dm%02ds' % (
+                100 * self.count / self.total, left // 60, left % 60)
+        self.stream.write('\r' + text + '   ')
+        self.stream.flush()
+
+    def close(self):
+        self.show()
+        self.stream.write('\n')
+
+
+def _finished_lines(path):
+    '''
+    number of complete results in an output, cutting off a last line that
+    was only partly written when the run stopped
+    '''
+    with open(path, 'rb+') as file:
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        last = data.rfind(b'\n', 0, end - 1) + 1
+        if end:
+            try:
+                json.loads(data[last:end])
+            except ValueError:
+                end = last
+        file.truncate(end)
+        return data.count(b'\n', 0, end)
+
+
+def _total(path):
+    ''' number of states read_states will yield, text counted in one scan '''
+    with open(path, 'rb') as file:
+        if file.read(len(archive.MAGIC)) == archive.MAGIC:
+            return len(archive.ArchiveReader(path))
+    count = 0
+    digits = 0
+    with open(path, errors='replace') as file:
+        for line in file:
+            text = ''.join(line.split())
+            if text.strip('012345'):
+                count += 1
+                digits = 0
+                continue
+            digits += len(text)
+            count += digits // 54
+            digits %= 54
+    return count + (digits > 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve a file of states.')
+    parser.add_argument('input')
+    parser.add_argument('-o', '--output', default='-',
+                        help='JSON lines file (default stdout)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK)
+    parser.add_argument('--max-length', type=int,
+                        default=solver.DEFAULT_MAX_LENGTH)
+    parser.add_argument('--tables', default=solver.default_table_path)
+    parser.add_argument('--cache', nargs='?',
+                        const=solvecache.default_cache_path, metavar='PATH',
+                        help='look up and keep solutions in a solution cache '
+                        '(default %(const)s)')
+    parser.add_argument('--improve', type=float, default=0.0,
+                        metavar='SECONDS', help='look for shorter solutions '
+                        'this long after the first one (default 0)')
+    parser.add_argument('--resume', action='store_true',
+                        help='append to an existing output')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    skip = 0
+    if args.output == '-':
+        out = sys.stdout
+    else:
+        if args.resume and os.path.exists(args.output):
+            skip = _finished_lines(args.output)
+        out = open(args.output, 'a' if skip else 'w')
+
+    total = _total(args.input)
+    progress = None if args.quiet else Progress(
+        total - skip if total is not None else None)
+    try:
+        for result in solve_stream(read_states(args.input, skip),
+                                   args.workers, args.chunk,
+                                   args.max_length, args.tables,
+                                   args.cache, args.improve):
+            out.write(json.dumps(result) + '\n')
+            # a killed run leaves only whole lines behind for --resume
+            out.flush()
+            if progress:
+                progress.step()
+    finally:
+        if progress:
+            progress.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
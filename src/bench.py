@@ -0,0 +1,392 @@
+'''
+Benchmarks of the hot paths, run headless (no window, no arcade).
+
+    python bench.py [-o results.json] [--baseline bench.baseline.json]
+                    [--threshold 0.15] [--update-baseline] [--quick]
+                    [name ...]
+
+Every benchmark reports seconds per operation (median and best of its
+repeats) and operations per second. Results are written as JSON together
+with a description of the machine. If a baseline file exists, every
+benchmark slower than baseline * (1 + threshold) is flagged and the exit
+status is 1.
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import batch
+import classify
+import nxn
+import picking
+import projection
+import scramble
+import solver
+import symmetry
+from cube import NUM_MOVES, CubeState
+
+default_baseline_path = os.path.join(os.path.dirname(__file__),
+                                     'bench.baseline.json')
+DEFAULT_THRESHOLD = 0.15
+
+# name -> setup function returning (run, ops); run() does ops operations
+benchmarks = {}
+
+
+def benchmark(name, repeat=7):
+    def register(setup):
+        benchmarks[name] = (setup, repeat)
+        return setup
+    return register
+
+
+def _random_moves(n, seed=1):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(NUM_MOVES) for _ in range(n))
+
+
+@benchmark('moves.rotate')
+def _moves_rotate():
+    ''' Game.rotate_side_cw / rotate_side_ccw '''
+    cube = CubeState()
+    sides = [s % 6 for s in range(600)]
+
+    def run():
+        for side in sides:
+            cube.rotate_cw(side)
+            cube.rotate_ccw(side)
+    return run, 2 * len(sides)
+
+
+@benchmark('moves.apply')
+def _moves_apply():
+    cube = CubeState()
+    moves = _random_moves(10000)
+
+    def run():
+        cube.apply_moves(moves)
+    return run, len(moves)
+
+
+@benchmark('moves.batch')
+def _moves_batch():
+    ''' one move on one row of a CubeBatch counts as an operation '''
+    states = scramble.random_states(10000, seed=1)
+    rows = np.frombuffer(_random_moves(len(states) * 20), dtype=np.uint8)
+    rows = rows.reshape(len(states), 20)
+
+    def run():
+        batch.apply_move_rows(states, rows)
+    return run, rows.size
+
+
+@benchmark('moves.nxn7')
+def _moves_nxn7():
+    state = nxn.NxNState(7)
+    rng = random.Random(7)
+    moves = [rng.randrange(state.puzzle.num_moves) for _ in range(5000)]
+
+    def run():
+        state.apply_moves(moves)
+    return run, len(moves)
+
+
+@benchmark('frame.orbit')
+def _frame_orbit():
+    ''' Game.update geometry while dragging: a new view every frame '''
+    cache = projection.ProjectionCache(projection.face_geometry())
+
+    def run():
+        for y in range(360):
+            cache.get(-20, y, 17, 300, 300)
+    return run, 360
+
+
+@benchmark('frame.turn')
+def _frame_turn():
+    ''' Game.update geometry while a layer turn animates '''
+    cache = projection.ProjectionCache(projection.face_geometry())
+    steps = [(side, deg) for side in range(6) for deg in range(0, 90, 5)]
+
+    def run():
+        for layer in steps:
+            cache.get(-20, 210, 17, 300, 300, [layer])
+    return run, len(steps)
+
+
+@benchmark('frame.orbit7')
+def _frame_orbit7():
+    ''' frame.orbit on a 7x7 (294 stickers) '''
+    p = nxn.puzzle(7)
+    cache = projection.ProjectionCache(p.geometry, p.layer_stickers)
+
+    def run():
+        for y in range(360):
+            cache.get(-20, y, 17, 300, 300)
+    return run, 360
+
+
+@benchmark('frame.turn7')
+def _frame_turn7():
+    ''' frame.turn on a 7x7, turning a slice layer '''
+    p = nxn.puzzle(7)
+    cache = projection.ProjectionCache(p.geometry, p.layer_stickers)
+    steps = [(side, deg, 3) for side in range(6) for deg in range(0, 90, 5)]
+
+    def run():
+        for layer in steps:
+            cache.get(-20, 210, 17, 300, 300, [layer])
+    return run, len(steps)
+
+
+def _pick_points(frame, count=200):
+    points = []
+    for i in frame.order:
+        if frame.facing[i]:
+            quad = frame.quads[i]
+            points.append((sum(p[0] for p in quad) / 4,
+                           sum(p[1] for p in quad) / 4))
+    points.append((5, 5))
+    return (points * (count // len(points) + 1))[:count]
+
+
+@benchmark('pick.first')
+def _pick_first():
+    ''' right_mouse_pressed on a new frame, index built then queried '''
+    cache = projection.ProjectionCache(projection.face_geometry())
+    frame = cache.get(-20, 210, 17, 300, 300)
+    points = _pick_points(frame, 50)
+
+    def run():
+        for x, y in points:
+            picking.QuadIndex(frame.quads, frame.facing,
+                              frame.order).pick(x, y)
+    return run, len(points)
+
+
+@benchmark('pick.cached')
+def _pick_cached():
+    ''' right_mouse_pressed on an unchanged frame '''
+    cache = projection.ProjectionCache(projection.face_geometry())
+    frame = cache.get(-20, 210, 17, 300, 300)
+    index = picking.QuadIndex(frame.quads, frame.facing, frame.order)
+    points = _pick_points(frame)
+
+    def run():
+        for x, y in points:
+            index.pick(x, y)
+    return run, len(points)
+
+
+@benchmark('classify.stage')
+def _classify_stage():
+    ''' Game.derive_state '''
+    states = [bytes(s) for s in scramble.random_states(2000, seed=2)]
+
+    def run():
+        for s in states:
+            classify.stage(s)
+    return run, len(states)
+
+
+@benchmark('classify.many')
+def _classify_many():
+    states = scramble.random_states(100000, seed=3)
+
+    def run():
+        classify.classify_many(states)
+    return run, len(states)
+
+
+@benchmark('scramble.stickers')
+def _scramble_stickers():
+    rng = random.Random(4)
+
+    def run():
+        for _ in range(500):
+            scramble.random_cubie(rng).to_stickers()
+    return run, 500
+
+
+@benchmark('scramble.states')
+def _scramble_states():
+    def run():
+        scramble.random_states(100000, seed=5)
+    return run, 100000
+
+
+@benchmark('symmetry.canonical')
+def _symmetry_canonical():
+    states = [bytes(s) for s in scramble.random_states(500, seed=8)]
+
+    def run():
+        for s in states:
+            symmetry.canonical(s)
+    return run, len(states)
+
+
+@benchmark('symmetry.many')
+def _symmetry_many():
+    states = scramble.random_states(20000, seed=9)
+
+    def run():
+        symmetry.canonical_many(states)
+    return run, len(states)
+
+
+@benchmark('solve', repeat=25)
+def _solve():
+    ''' one random state per repeat; skipped without solver tables '''
+    tables = solver.load_tables()
+    if tables is None:
+        return None
+    solve = solver.Solver(tables)
+    states = iter([bytes(s) for s in scramble.random_states(25, seed=6)])
+
+    def run():
+        solve.solve_stickers(next(states))
+    return run, 1
+
+
+def measure(setup, repeat):
+    ''' per operation seconds of one benchmark, or None if skipped '''
+    prepared = setup()
+    if prepared is None:
+        return None
+    run, ops = prepared
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - began) / ops)
+    median = statistics.median(times)
+    return {
+        'median': median,
+        'best': min(times),
+        'ops_per_sec': 1.0 / median if median else float('inf'),
+        'repeat': repeat,
+    }
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'revision': _git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def run_benchmarks(names=None, quick=False, progress=None):
+    ''' results dict of the named benchmarks (all by default) '''
+    results = {}
+    for name, (setup, repeat) in benchmarks.items():
+        if names and not any(name == n or name.startswith(n + '.')
+                             for n in names):
+            continue
+        if quick:
+            repeat = max(3, repeat // 3)
+        result = measure(setup, repeat)
+        if progress:
+            progress(name, result)
+        if result is not None:
+            results[name] = result
+    return {'machine': machine(), 'results': results}
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''
+    [(name, ratio, regressed)] for the benchmarks present in both, ratio
+    being current / baseline time per operation.
+    '''
+    rows = []
+    old = baseline['results']
+    for name, result in results['results'].items():
+        if name not in old:
+            continue
+        ratio = result['median'] / old[name]['median']
+        rows.append((name, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '%.3g %s' % (seconds * scale, unit)
+    return '%.3g ns' % (seconds * 1e9)
+
+
+def default_progress(name, result):
+    if result is None:
+        print('%-18s skipped' % name)
+    else:
+        print('%-18s %10s/op %14.0f op/s' % (
+            name, _format_time(result['median']), result['ops_per_sec']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmarks.')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks or groups to run (default all)')
+    parser.add_argument('-o', '--output', help='write results JSON here')
+    parser.add_argument('--baseline', default=default_baseline_path)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown as a fraction')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store these results as the baseline')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer repeats')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, args.quick, default_progress)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print('baseline written to', args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressed = 0
+    print()
+    print('against %s (threshold %+.0f%%)' % (args.baseline,
+                                              100 * args.threshold))
+    for name, ratio, slower in compare(results, baseline, args.threshold):
+        regressed += slower
+        print('%-18s %+7.1f%%%s' % (name, 100 * (ratio - 1),
+                                    '  REGRESSION' if slower else ''))
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
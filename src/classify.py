@@ -0,0 +1,123 @@
+'''
+Beginner method stage of a cube, the same stages Game.derive_state reports,
+for one state or an (N, 54) array of them.
+
+Every check is a precomputed set of sticker indices that must hold a given
+color or must match another sticker, so a whole batch is graded with a few
+NumPy comparisons. NumPy is only imported by the batch functions, a single
+state is checked in plain Python.
+'''
+
+from cube import SOLVED, WHITE, YELLOW
+
+stage_names = ['Scambled', 'Daisy', 'White Cross', 'Upper/white Layer',
+               'Middle layer', 'Yellow Cross', 'Solved']
+
+SCRAMBLED = 0
+DAISY = 1
+WHITE_CROSS = 2
+UPPER_LAYER = 3
+MIDDLE_LAYER = 4
+YELLOW_CROSS = 5
+SOLVED_STAGE = 6
+
+_ring = [s for s in range(6) if s not in (WHITE, YELLOW)]
+_edges = [1, 3, 5, 7]
+
+# (indices, color): stickers that must show color
+_white_cross = ([WHITE * 9 + i for i in _edges], WHITE)
+_daisy = ([YELLOW * 9 + i for i in _edges], WHITE)
+_white_face = ([WHITE * 9 + i for i in range(9)], WHITE)
+_yellow_cross = ([YELLOW * 9 + i for i in _edges], YELLOW)
+
+# (a, b): stickers a[k] and b[k] must match
+_upper_pairs = ([s * 9 + i for s in _ring for i in (6, 7)],
+                [s * 9 + i + 1 for s in _ring for i in (6, 7)])
+_middle_pairs = ([s * 9 + i for s in _ring for i in (3, 4, 5)],
+                 [s * 9 + i + 3 for s in _ring for i in (3, 4, 5)])
+_ring_edge_pairs = ([s * 9 + 1 for s in _ring], [s * 9 + 4 for s in _ring])
+
+
+def _colored(s, check):
+    idx, color = check
+    for i in idx:
+        if s[i] != color:
+            return False
+    return True
+
+
+def _matching(s, pairs):
+    for a, b in zip(*pairs):
+        if s[a] != s[b]:
+            return False
+    return True
+
+
+def stage(stickers):
+    ''' stage code of 54 stickers '''
+    s = stickers
+    if not _colored(s, _white_cross):
+        return DAISY if _colored(s, _daisy) else SCRAMBLED
+    if not (_colored(s, _white_face) and _matching(s, _upper_pairs)):
+        return WHITE_CROSS
+    if not _matching(s, _middle_pairs):
+        return UPPER_LAYER
+    if not (_matching(s, _ring_edge_pairs) and _colored(s, _yellow_cross)):
+        return MIDDLE_LAYER
+    if bytes(s) != SOLVED:
+        return YELLOW_CROSS
+    return SOLVED_STAGE
+
+
+def stage_name(stickers):
+    return stage_names[stage(stickers)]
+
+
+def _colored_many(states, check):
+    idx, color = check
+    return (states[:, idx] == color).all(axis=1)
+
+
+def _matching_many(states, pairs):
+    a, b = pairs
+    return (states[:, a] == states[:, b]).all(axis=1)
+
+
+def classify_many(states):
+    ''' (N,) uint8 stage codes of an (N, 54) state array '''
+    import numpy as np
+    states = np.asarray(states, dtype=np.uint8)
+    cross = _colored_many(states, _white_cross)
+    daisy = _colored_many(states, _daisy)
+    # each later stage also needs every earlier one
+    reached = np.logical_and.accumulate(np.stack([
+        cross,
+        _colored_many(states, _white_face) & _matching_many(
+            states, _upper_pairs),
+        _matching_many(states, _middle_pairs),
+        _matching_many(states, _ring_edge_pairs) & _colored_many(
+            states, _yellow_cross),
+        (states == np.frombuffer(SOLVED, dtype=np.uint8)).all(axis=1),
+    ]), axis=0)
+    codes = reached.sum(axis=0).astype(np.uint8) + 1
+    codes[~cross] = np.where(daisy[~cross], DAISY, SCRAMBLED)
+    return codes
+
+
+def histogram(codes):
+    ''' {stage name: count} of an array of stage codes '''
+    import numpy as np
+    counts = np.bincount(np.asarray(codes), minlength=len(stage_names))
+    return {name: int(c) for name, c in zip(stage_names, counts)}
+
+
+def report(codes):
+    ''' text table of the stage histogram '''
+    counts = histogram(codes)
+    total = sum(counts.values()) or 1
+    lines = ['%-18s %10s %7s' % ('stage', 'count', 'share')]
+    for name, count in counts.items():
+        lines.append('%-18s %10d %6.2f%%' % (name, count,
+                                             100.0 * count / total))
+    lines.append('%-18s %10d' % ('total', sum(counts.values())))
+    return '\n'.join(lines)
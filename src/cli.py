@@ -0,0 +1,156 @@
+'''
+Command line tools for the cube model, without a window.
+
+    python cli.py scramble [-n COUNT] [--seed SEED] [--config]
+    python cli.py apply MOVE ... [-i FILE] [--config]
+    python cli.py classify [FILE ...] [--histogram]
+    python cli.py render [FILE] [-o image.png] [--size 600]
+    python cli.py bench [bench.py arguments]
+    python cli.py gui
+
+States are read as 54 digits (one color per sticker, sides in cube.py
+order), either on one line or as the six 9 digit lines of session.cube;
+'-' or no file reads standard input. Moves are written in Singmaster
+notation (R U R' U2, see moves.py) or named like '3cw', '0ht' or '2cc'.
+
+Only the modules a subcommand needs are imported, and arcade only for
+gui, so short lived batch jobs start in a few tens of milliseconds.
+'''
+
+import argparse
+import sys
+
+from cube import CubeState
+
+
+def read_states(paths):
+    ''' yield 54 sticker bytes for every state in the files '''
+    for path in paths or ['-']:
+        if path == '-':
+            text = sys.stdin.read()
+        else:
+            with open(path) as file:
+                text = file.read()
+        digits = ''.join(text.split())
+        if len(digits) % 54:
+            raise ValueError('%s does not hold whole cube states' % path)
+        for i in range(0, len(digits), 54):
+            yield CubeState.from_config(
+                [digits[j:j + 9] for j in range(i, i + 54, 9)]).stickers
+
+
+def format_state(stickers, config=False):
+    digits = ''.join(str(c) for c in stickers)
+    if config:
+        return '\n'.join(digits[i:i + 9] for i in range(0, 54, 9))
+    return digits
+
+
+def _write_states(states, config):
+    out = sys.stdout
+    for stickers in states:
+        out.write(format_state(stickers, config))
+        out.write('\n')
+
+
+def cmd_scramble(args):
+    import scramble
+    for states in scramble.state_blocks(args.count, args.seed):
+        _write_states(states.tolist(), args.config)
+
+
+def cmd_apply(args):
+    import moves
+    # the whole sequence is one permutation, one gather per state
+    macro = moves.compile_moves(' '.join(args.moves))
+    states = read_states(args.input) if args.input else [CubeState().stickers]
+    _write_states((macro.apply(stickers) for stickers in states), args.config)
+
+
+def cmd_classify(args):
+    import classify
+    states = list(read_states(args.files))
+    if args.histogram:
+        import numpy as np
+        rows = np.frombuffer(b''.join(states), dtype=np.uint8).reshape(-1, 54)
+        print(classify.report(classify.classify_many(rows)))
+    else:
+        for stickers in states:
+            print(classify.stage_name(stickers))
+
+
+def cmd_render(args):
+    import raster
+    stickers = next(read_states(args.file and [args.file]))
+    raster.write_png(args.output, raster.render(stickers, size=args.size))
+
+
+def cmd_bench(args):
+    import bench
+    return bench.main(args.args)
+
+
+def cmd_gui(args):
+    import main
+    main.main()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Headless cube tools.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('scramble', help='print random states')
+    p.add_argument('-n', '--count', type=int, default=1)
+    p.add_argument('--seed', type=int, default=None,
+                   help='same seed, same states; a larger count only '
+                        'adds states after them')
+    p.add_argument('--config', action='store_true',
+                   help='six lines per state, like session.cube')
+    p.set_defaults(func=cmd_scramble)
+
+    p = commands.add_parser('apply', help='apply moves to states')
+    p.add_argument('moves', nargs='+', help="moves like R U' F2 or '3cw'")
+    p.add_argument('-i', '--input', nargs='+',
+                   help="state files ('-' for stdin), default solved")
+    p.add_argument('--config', action='store_true')
+    p.set_defaults(func=cmd_apply)
+
+    p = commands.add_parser('classify', help='print the solving stage')
+    p.add_argument('files', nargs='*')
+    p.add_argument('--histogram', action='store_true',
+                   help='stage counts instead of one line per state')
+    p.set_defaults(func=cmd_classify)
+
+    p = commands.add_parser('render', help='write a PNG of a state')
+    p.add_argument('file', nargs='?')
+    p.add_argument('-o', '--output', default='image.png')
+    p.add_argument('--size', type=int, default=600)
+    p.set_defaults(func=cmd_render)
+
+    p = commands.add_parser('bench', help='run bench.py',
+                            add_help=False)
+    p.add_argument('args', nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_bench)
+
+    p = commands.add_parser('gui', help='open the game window')
+    p.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # bench options belong to bench.py, hand them over untouched
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        args.args = extra + args.args
+    elif extra:
+        parser.error('unrecognized arguments: %s' % ' '.join(extra))
+    try:
+        return args.func(args)
+    except (ValueError, OSError) as e:
+        print('error:', e, file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
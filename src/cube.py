@@ -0,0 +1,192 @@
+'''
+Headless cube state and move engine.
+
+Stickers are numbered in one flat 54 entry buffer, side major
+(side * 9 + face), using the same side / face numbering as Game.cubepiece.
+Every face turn is a precomputed index permutation derived from
+sideneighbors, sideconnections and connectedfaces. Nothing in here imports
+arcade.
+'''
+
+from operator import itemgetter
+
+BLUE = 0
+ORANGE = 1
+GREEN = 2
+RED = 3
+WHITE = 4
+YELLOW = 5
+
+sidename = ['BLUE', 'ORANGE', 'GREEN', 'RED', 'WHITE', 'YELLOW']
+sideneighbors = [[4, 3, 5, 1], [4, 0, 5, 2], [4, 1, 5, 3], [4, 2, 5, 0],
+                 [3, 0, 1, 2], [1, 0, 3, 2]]
+sideconnections = [[0, 5, 0, 3, 1, 7], [3, 0, 5, 0, 3, 3], [0, 3, 0, 5, 7, 1],
+                   [5, 0, 3, 0, 5, 5], [7, 7, 7, 7, 0, 0], [1, 1, 1, 1, 0, 0]]
+connectedfaces = [[], [0, 1, 2], [], [6, 3, 0], [], [2, 5, 8], [], [8, 7, 6],
+                  []]
+
+cubeinit = [
+    '000000000', '111111111', '222222222', '333333333', '444444444',
+    '555555555'
+]
+
+SOLVED = bytes(s for s in range(6) for f in range(9))
+SOLVED_LOCATIONS = bytes(range(54))
+
+# a move is side * 3 + turn
+CW = 0
+HALF = 1
+CCW = 2
+turnname = ['cw', 'ht', 'cc']
+
+NUM_MOVES = 18
+
+
+def _side_permutation(side, ccw):
+    # run the classic in place swaps on a buffer of sticker indices; what ends
+    # up in each slot is the index it is gathered from
+    piece = [[s * 9 + f for f in range(9)] for s in range(6)]
+    if ccw:
+        cycles = ((0, 2, 8, 6), (1, 5, 7, 3))
+        order = sideneighbors[side]
+        first = order[-1]
+    else:
+        cycles = ((6, 8, 2, 0), (3, 7, 5, 1))
+        order = list(reversed(sideneighbors[side]))
+        first = order[-1]
+
+    for a, b, c, d in cycles:
+        p = piece[side]
+        p[a], p[b], p[c], p[d] = p[b], p[c], p[d], p[a]
+
+    tcf = connectedfaces[sideconnections[side][first]]
+    carry = [piece[first][tcf[i]] for i in range(3)]
+    for n in order:
+        tcf = connectedfaces[sideconnections[side][n]]
+        for i in range(3):
+            piece[n][tcf[i]], carry[i] = carry[i], piece[n][tcf[i]]
+
+    return tuple(i for p in piece for i in p)
+
+
+def compose(first, second):
+    ''' permutation applying first and then second '''
+    return tuple(first[i] for i in second)
+
+
+def invert(perm):
+    inv = [0] * len(perm)
+    for i, p in enumerate(perm):
+        inv[p] = i
+    return tuple(inv)
+
+
+def _build_moves():
+    moves = []
+    for side in range(6):
+        cw = _side_permutation(side, False)
+        ccw = _side_permutation(side, True)
+        moves += [cw, compose(cw, cw), ccw]
+    return moves
+
+
+# gather permutations: after move m, sticker i holds what was at MOVES[m][i]
+MOVES = _build_moves()
+
+# the engine tracks where every sticker is instead of what is in every slot,
+# so a move becomes a byte translate: position p goes to _LOCATE[m][p]
+_LOCATE = [bytes(invert(p)) + bytes(256 - 54) for p in MOVES]
+
+
+def move_index(side, turn=CW):
+    return side * 3 + turn
+
+
+def inverse_move(move):
+    return move - move % 3 + 2 - move % 3
+
+
+def move_name(move):
+    return str(move // 3) + turnname[move % 3]
+
+
+def parse_move(name):
+    ''' parse history style names like '3cw' or '0cc' '''
+    return int(name[0]) * 3 + turnname.index(name[1:3])
+
+
+class CubeState:
+    ''' A 3x3 cube stored as one flat sticker buffer. '''
+
+    __slots__ = ('colors', 'where')
+
+    def __init__(self, stickers=SOLVED):
+        self.set_stickers(stickers)
+
+    def set_stickers(self, stickers):
+        self.colors = bytes(stickers)
+        if len(self.colors) != 54:
+            raise ValueError('a cube has 54 stickers, got %d' %
+                             len(self.colors))
+        self.where = SOLVED_LOCATIONS
+
+    @classmethod
+    def from_config(cls, configuration):
+        ''' build from the six 9 digit strings used by set_cube '''
+        if len(configuration) != 6 or any(len(c) != 9 for c in configuration):
+            raise ValueError('error in configuration: %s' % (configuration,))
+        return cls(int(d) for c in configuration for d in c)
+
+    def to_config(self):
+        s = self.stickers
+        return [''.join(str(c) for c in s[i:i + 9]) for i in range(0, 54, 9)]
+
+    @property
+    def stickers(self):
+        ''' current sticker colors as 54 bytes '''
+        out = bytearray(54)
+        colors = self.colors
+        for i, p in enumerate(self.where):
+            out[p] = colors[i]
+        return bytes(out)
+
+    def faces(self):
+        ''' stickers as six 9 item lists, the Game.cubepiece layout '''
+        s = self.stickers
+        return [list(s[i:i + 9]) for i in range(0, 54, 9)]
+
+    def copy(self):
+        c = CubeState.__new__(CubeState)
+        c.colors = self.colors
+        c.where = self.where
+        return c
+
+    def apply(self, move):
+        self.where = self.where.translate(_LOCATE[move])
+
+    def apply_moves(self, moves):
+        where = self.where
+        for m in moves:
+            where = where.translate(_LOCATE[m])
+        self.where = where
+
+    def apply_macro(self, macro):
+        ''' a whole compiled sequence (moves.Macro) in one translate '''
+        self.where = self.where.translate(macro.locate)
+
+    def rotate_cw(self, side):
+        self.where = self.where.translate(_LOCATE[side * 3])
+
+    def rotate_ccw(self, side):
+        self.where = self.where.translate(_LOCATE[side * 3 + 2])
+
+    def rotate_half(self, side):
+        self.where = self.where.translate(_LOCATE[side * 3 + 1])
+
+    def is_solved(self):
+        return self.stickers == SOLVED
+
+
+def apply_permutation(stickers, perm):
+    ''' gather stickers through a 54 entry permutation '''
+    return bytes(itemgetter(*perm)(stickers))
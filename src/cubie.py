@@ -0,0 +1,180 @@
+'''
+Cubie level view of the cube: which corner / edge piece sits in which slot
+and how it is twisted.
+
+Corner and edge slots are found from the same sticker geometry Game.setup
+builds, so the mapping always follows the sticker numbering of cube.py.
+WHITE / YELLOW is the reference (U / D) axis, BLUE / GREEN the R / L axis
+and ORANGE / RED the F / B axis. Edge slots 8 - 11 form the middle slice
+between WHITE and YELLOW.
+
+Cubies use the "replaced by" convention: cp[i] is the corner sitting in
+slot i and co[i] its twist there.
+'''
+
+import math
+
+from cube import MOVES, NUM_MOVES, SOLVED
+
+
+def _rotatey(p, deg):
+    rad = math.radians(deg)
+    s = round(math.sin(rad))
+    c = round(math.cos(rad))
+    return (p[0] * c + p[2] * s, p[1], -p[0] * s + p[2] * c)
+
+
+def _rotatez(p, deg):
+    rad = math.radians(deg)
+    s = round(math.sin(rad))
+    c = round(math.cos(rad))
+    return (p[0] * c - p[1] * s, p[0] * s + p[1] * c, p[2])
+
+
+def sticker_cells():
+    ''' (cubie position, outward normal) of every sticker, on a -1..1 grid '''
+    left = []
+    for y in range(3):
+        for z in range(3):
+            left.append(((-1, y - 1, z - 1), (-1, 0, 0)))
+    sides = [left]
+    for deg in (-90, -180, -270):
+        sides.append([(_rotatey(p, deg), _rotatey(n, deg)) for p, n in left])
+    for deg in (-90, 90):
+        sides.append([(_rotatez(p, deg), _rotatez(n, deg)) for p, n in left])
+    return [cell for side in sides for cell in side]
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0])
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _slots():
+    by_position = {}
+    for i, (p, n) in enumerate(sticker_cells()):
+        by_position.setdefault(p, []).append((i, n))
+
+    corners = []
+    edges = []
+    slice_edges = []
+    for p in sorted(by_position):
+        cells = by_position[p]
+        if len(cells) == 3:
+            # U / D sticker first, then the others clockwise seen from outside
+            cells.sort(key=lambda c: c[1][1] == 0)
+            if _dot(_cross(cells[0][1], cells[1][1]), p) < 0:
+                cells[1], cells[2] = cells[2], cells[1]
+            corners.append(tuple(c[0] for c in cells))
+        elif len(cells) == 2:
+            # reference sticker: U / D if it has one, else F / B
+            cells.sort(key=lambda c: (c[1][1] == 0, c[1][2] == 0))
+            if p[1] == 0:
+                slice_edges.append(tuple(c[0] for c in cells))
+            else:
+                edges.append(tuple(c[0] for c in cells))
+    return corners, edges + slice_edges
+
+
+# sticker indices of each corner and edge slot, reference sticker first
+corner_facelets, edge_facelets = _slots()
+
+corner_colors = [tuple(SOLVED[f] for f in fs) for fs in corner_facelets]
+edge_colors = [tuple(SOLVED[f] for f in fs) for fs in edge_facelets]
+
+_corner_lookup = {}
+for _i, _c in enumerate(corner_colors):
+    for _o in range(3):
+        _corner_lookup[_c[_o:] + _c[:_o]] = (_i, (3 - _o) % 3)
+_edge_lookup = {}
+for _i, _c in enumerate(edge_colors):
+    _edge_lookup[_c] = (_i, 0)
+    _edge_lookup[_c[::-1]] = (_i, 1)
+
+
+class CubieCube:
+    ''' Corner and edge permutation / orientation of a cube. '''
+
+    __slots__ = ('cp', 'co', 'ep', 'eo')
+
+    def __init__(self, cp=None, co=None, ep=None, eo=None):
+        self.cp = list(range(8)) if cp is None else list(cp)
+        self.co = [0] * 8 if co is None else list(co)
+        self.ep = list(range(12)) if ep is None else list(ep)
+        self.eo = [0] * 12 if eo is None else list(eo)
+
+    @classmethod
+    def from_stickers(cls, stickers):
+        ''' read a 54 sticker state; raises ValueError for impossible cubes '''
+        for side in range(6):
+            if stickers[side * 9 + 4] != side:
+                raise ValueError('center of side %d is not color %d' %
+                                 (side, side))
+        cube = cls()
+        for i, fs in enumerate(corner_facelets):
+            colors = tuple(stickers[f] for f in fs)
+            found = _corner_lookup.get(colors)
+            if found is None:
+                raise ValueError('no such corner %s' % (colors,))
+            cube.cp[i], cube.co[i] = found
+        for i, fs in enumerate(edge_facelets):
+            colors = tuple(stickers[f] for f in fs)
+            found = _edge_lookup.get(colors)
+            if found is None:
+                raise ValueError('no such edge %s' % (colors,))
+            cube.ep[i], cube.eo[i] = found
+        return cube
+
+    def to_stickers(self):
+        out = bytearray(SOLVED)
+        for i, fs in enumerate(corner_facelets):
+            colors = corner_colors[self.cp[i]]
+            o = self.co[i]
+            for k in range(3):
+                out[fs[(k + o) % 3]] = colors[k]
+        for i, fs in enumerate(edge_facelets):
+            colors = edge_colors[self.ep[i]]
+            o = self.eo[i]
+            for k in range(2):
+                out[fs[(k + o) % 2]] = colors[k]
+        return bytes(out)
+
+    def multiply(self, b):
+        ''' this cube followed by b, as a new cube '''
+        return CubieCube(
+            [self.cp[p] for p in b.cp],
+            [(self.co[p] + o) % 3 for p, o in zip(b.cp, b.co)],
+            [self.ep[p] for p in b.ep],
+            [(self.eo[p] + o) % 2 for p, o in zip(b.ep, b.eo)])
+
+    def __eq__(self, other):
+        return (self.cp == other.cp and self.co == other.co and
+                self.ep == other.ep and self.eo == other.eo)
+
+    def verify(self):
+        ''' True if the pieces form a cube reachable by face turns '''
+        if sorted(self.cp) != list(range(8)) or sum(self.co) % 3:
+            return False
+        if sorted(self.ep) != list(range(12)) or sum(self.eo) % 2:
+            return False
+        return permutation_parity(self.cp) == permutation_parity(self.ep)
+
+
+def permutation_parity(p):
+    parity = 0
+    for i in range(len(p)):
+        for j in range(i + 1, len(p)):
+            if p[j] < p[i]:
+                parity ^= 1
+    return parity
+
+
+# every move as a cubie cube
+move_cubes = [
+    CubieCube.from_stickers(bytes(SOLVED[i] for i in MOVES[m]))
+    for m in range(NUM_MOVES)
+]
@@ -0,0 +1,196 @@
+'''
+Breadth first exploration of the state space, counting the distinct states
+at every depth.
+
+    python explore.py DEPTH [--start session.cube] [--workers N]
+                      [--shards S] [--frontier DIR]
+
+States travel as packed words (packed.py, 24 bytes each) in sorted NumPy
+arrays kept in files, never as Python objects. The space is split into
+shards by a hash of the packed state and every shard is owned by one task:
+
+    expand   a shard's frontier through all 18 moves, sending every child
+             to the shard its hash falls in
+    merge    the children a shard received, minus its last two depths
+             (a face turn neighbour of depth d is at depth d - 1, d or
+             d + 1), become its next frontier
+
+so only two depths per shard are ever held, and the shards of a depth are
+worked on in parallel. With --frontier every depth is also written as an
+archive (archive.py) of its states.
+'''
+
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import archive
+import batch
+import packed
+from cube import NUM_MOVES, SOLVED
+
+DEFAULT_CHUNK = 1 << 17
+_MIX = (np.uint64(0x9e3779b97f4a7c15), np.uint64(0xc2b2ae3d27d4eb4f),
+        np.uint64(0x165667b19e3779f9))
+
+
+def shard_of(words, shards):
+    ''' shard number of every row of (N, 3) packed words '''
+    h = words[:, 0] * _MIX[0] ^ words[:, 1] * _MIX[1] ^ words[:, 2] * _MIX[2]
+    return ((h >> np.uint64(32)) % np.uint64(shards)).astype(np.intp)
+
+
+def _unique_words(words):
+    keys = np.unique(packed.keys(words))
+    return keys.view(np.uint64).reshape(-1, 3)
+
+
+def _path(work, depth, shard):
+    return os.path.join(work, 'depth-%02d' % depth, 'shard-%04d.npy' % shard)
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return np.zeros((0, 3), dtype=np.uint64)
+    return np.load(path)
+
+
+def _expand(job):
+    ''' children of one shard's frontier, split up by target shard '''
+    work, depth, shard, shards, chunk = job
+    frontier = _load(_path(work, depth, shard))
+    out = os.path.join(work, 'depth-%02d' % (depth + 1))
+    for part, start in enumerate(range(0, len(frontier), chunk)):
+        states = packed.unpack_many(frontier[start:start + chunk])
+        children = np.concatenate([
+            packed.pack_many(batch.apply_move(states, m))
+            for m in range(NUM_MOVES)])
+        target = shard_of(children, shards)
+        for t in range(shards):
+            mine = _unique_words(children[target == t])
+            if len(mine):
+                np.save(os.path.join(out, 'in-%04d-%04d-%04d.npy' %
+                                     (t, shard, part)), mine)
+    return len(frontier)
+
+
+def _merge(job):
+    ''' next frontier of one shard, returns its size '''
+    work, depth, shard = job
+    inbox = sorted(glob.glob(os.path.join(
+        work, 'depth-%02d' % depth, 'in-%04d-*.npy' % shard)))
+    if inbox:
+        children = _unique_words(np.concatenate([np.load(p) for p in inbox]))
+    else:
+        children = np.zeros((0, 3), dtype=np.uint64)
+    keys = packed.keys(children)
+    keep = np.ones(len(children), dtype=bool)
+    for seen_depth in (depth - 1, depth - 2):
+        if seen_depth >= 0:
+            seen = packed.keys(_load(_path(work, seen_depth, shard)))
+            keep &= ~np.isin(keys, seen)
+    frontier = children[keep]
+    np.save(_path(work, depth, shard), frontier)
+    for p in inbox:
+        os.remove(p)
+    return len(frontier)
+
+
+def _dump(work, depth, shards, path):
+    with archive.ArchiveWriter(path) as writer:
+        for shard in range(shards):
+            words = _load(_path(work, depth, shard))
+            for start in range(0, len(words), DEFAULT_CHUNK):
+                writer.write_many(packed.unpack_many(
+                    words[start:start + DEFAULT_CHUNK]))
+
+
+def explore(max_depth, start=SOLVED, workers=None, shards=None,
+            frontier_dir=None, chunk=DEFAULT_CHUNK, progress=None,
+            work_dir=None):
+    '''
+    Count the states first reached at depth 0 .. max_depth from start.
+    Returns the list of counts; progress(depth, count, seconds) is called
+    as each depth finishes.
+    '''
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * 4
+    work = tempfile.mkdtemp(prefix='explore-', dir=work_dir)
+    pool = Pool(workers) if workers > 1 else None
+    run = pool.map if pool else lambda f, jobs: list(map(f, jobs))
+    try:
+        first = packed.pack_many(np.frombuffer(bytes(start), np.uint8)[None])
+        os.makedirs(os.path.join(work, 'depth-00'))
+        owner = shard_of(first, shards)[0]
+        for shard in range(shards):
+            np.save(_path(work, 0, shard),
+                    first if shard == owner else first[:0])
+        counts = [1]
+        if progress:
+            progress(0, 1, 0.0)
+        if frontier_dir:
+            os.makedirs(frontier_dir, exist_ok=True)
+            _dump(work, 0, shards, os.path.join(frontier_dir,
+                                                'depth-00.rca'))
+
+        for depth in range(1, max_depth + 1):
+            began = time.perf_counter()
+            os.makedirs(os.path.join(work, 'depth-%02d' % depth))
+            run(_expand, [(work, depth - 1, s, shards, chunk)
+                          for s in range(shards)])
+            count = sum(run(_merge, [(work, depth, s)
+                                     for s in range(shards)]))
+            counts.append(count)
+            if frontier_dir:
+                _dump(work, depth, shards, os.path.join(
+                    frontier_dir, 'depth-%02d.rca' % depth))
+            # depth - 2 is no longer needed by any merge
+            if depth >= 2:
+                shutil.rmtree(os.path.join(work, 'depth-%02d' % (depth - 2)))
+            if progress:
+                progress(depth, count, time.perf_counter() - began)
+            if not count:
+                break
+        return counts
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def default_progress(depth, count, seconds):
+    print('depth %2d: %12d states  %8.2fs' % (depth, count, seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Count the states at every depth from a start state.')
+    parser.add_argument('depth', type=int)
+    parser.add_argument('--start', help='session.cube style start state '
+                        '(default solved)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--frontier', metavar='DIR',
+                        help='write every depth as DIR/depth-NN.rca')
+    parser.add_argument('--work-dir', default=None,
+                        help='where to keep the shard files meanwhile')
+    args = parser.parse_args(argv)
+
+    start = archive.read_session(args.start) if args.start else SOLVED
+    began = time.perf_counter()
+    counts = explore(args.depth, start, args.workers, args.shards,
+                     args.frontier, progress=default_progress,
+                     work_dir=args.work_dir)
+    print('%d states within depth %d in %.2fs' % (
+        sum(counts), len(counts) - 1, time.perf_counter() - began))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+'''
+Move history as a byte array of move codes (see cube.py) with periodic
+state snapshots.
+
+Cutting off the redo tail only moves the end marker, and any position can
+be rebuilt from the nearest snapshot with at most checkpoint_interval
+moves, so scrubbing through millions of recorded moves stays interactive.
+'''
+
+from cube import CubeState, move_name, parse_move
+
+
+class MoveHistory:
+    ''' Moves made from a start state, with undo / redo and seeking. '''
+
+    def __init__(self, start=None, checkpoint_interval=1024):
+        self.interval = checkpoint_interval
+        self.reset(start)
+
+    def reset(self, start=None):
+        ''' forget every move, start is the state at position 0 '''
+        self.codes = bytearray()
+        self.length = 0
+        self.position = 0
+        # snapshots[j] is the state after j * interval moves
+        self.snapshots = [start.copy() if start else CubeState()]
+
+    def __len__(self):
+        return self.length
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < self.length
+
+    def push(self, move):
+        ''' record a move at the current position, dropping the redo tail '''
+        p = self.position
+        if p < len(self.codes):
+            self.codes[p] = move
+        else:
+            self.codes.append(move)
+        self.length = self.position = p + 1
+
+        keep = p // self.interval + 1
+        if len(self.snapshots) > keep:
+            del self.snapshots[keep:]
+        if self.length == len(self.snapshots) * self.interval:
+            state = self.snapshots[-1].copy()
+            state.apply_moves(self.codes[self.length - self.interval:
+                                         self.length])
+            self.snapshots.append(state)
+
+    def extend(self, moves):
+        for m in moves:
+            self.push(m)
+
+    def undo(self):
+        ''' step back, returns the move to revert or None '''
+        if self.position == 0:
+            return None
+        self.position -= 1
+        return self.codes[self.position]
+
+    def redo(self):
+        ''' step forward, returns the move to replay or None '''
+        if self.position == self.length:
+            return None
+        self.position += 1
+        return self.codes[self.position - 1]
+
+    def state_at(self, index):
+        ''' cube state after the first index moves '''
+        if not 0 <= index <= self.length:
+            raise IndexError('history index out of range')
+        j = index // self.interval
+        state = self.snapshots[j].copy()
+        state.apply_moves(self.codes[j * self.interval:index])
+        return state
+
+    def seek(self, index):
+        ''' move the current position, returns the state there '''
+        state = self.state_at(index)
+        self.position = index
+        return state
+
+    def moves(self):
+        return bytes(self.codes[:self.length])
+
+    def names(self):
+        return [move_name(m) for m in self.codes[:self.length]]
+
+    @classmethod
+    def from_names(cls, names, start=None, checkpoint_interval=1024):
+        ''' history of recorded names like '3cw', positioned at the end '''
+        history = cls(start, checkpoint_interval)
+        history.extend(parse_move(n) for n in names)
+        return history
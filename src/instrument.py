@@ -0,0 +1,117 @@
+'''
+Opt-in per-frame timing of the render loop.
+
+Game keeps a FrameProfiler only while profiling is switched on and checks
+for None before every measurement, so with it off a frame pays for a few
+attribute tests and nothing else. When on, each named phase of each frame
+is timed, the last `window` samples of every phase are kept for rolling
+percentiles, and recent phases can be written out as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev).
+'''
+
+import json
+import os
+import threading
+from collections import deque
+from time import perf_counter_ns
+
+DEFAULT_WINDOW = 240
+DEFAULT_TRACE_EVENTS = 100000
+
+
+def percentile(ordered, q):
+    ''' nearest rank q percentile of a sorted sequence '''
+    if not ordered:
+        return 0
+    k = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+class FrameProfiler:
+    ''' Phase timings of the last frames, in nanoseconds. '''
+
+    def __init__(self, window=DEFAULT_WINDOW,
+                 trace_events=DEFAULT_TRACE_EVENTS):
+        self.window = window
+        self.samples = {}
+        self.started = {}
+        # (name, start ns, duration ns, frame) for the trace
+        self.events = deque(maxlen=trace_events)
+        self.frame = 0
+        self.last_frame_start = None
+        self.origin = perf_counter_ns()
+
+    def begin(self, name):
+        self.started[name] = perf_counter_ns()
+
+    def end(self, name):
+        now = perf_counter_ns()
+        start = self.started.pop(name, now)
+        self._record(name, start, now - start)
+
+    def _record(self, name, start, duration):
+        series = self.samples.get(name)
+        if series is None:
+            series = self.samples[name] = deque(maxlen=self.window)
+        series.append(duration)
+        self.events.append((name, start, duration, self.frame))
+
+    def begin_frame(self):
+        now = perf_counter_ns()
+        if self.last_frame_start is not None:
+            # wall time between frames, including everything outside our
+            # handlers (event dispatch, buffer swap, vsync)
+            series = self.samples.get('interval')
+            if series is None:
+                series = self.samples['interval'] = deque(maxlen=self.window)
+            series.append(now - self.last_frame_start)
+        self.last_frame_start = now
+        self.frame += 1
+        self.begin('frame')
+
+    def end_frame(self):
+        self.end('frame')
+
+    def percentiles(self, name, qs=(50, 90, 99)):
+        ''' {q: milliseconds} over the rolling window of one phase '''
+        ordered = sorted(self.samples.get(name, ()))
+        return {q: percentile(ordered, q) / 1e6 for q in qs}
+
+    def stats(self, qs=(50, 90, 99)):
+        ''' {phase: {q: milliseconds}} of every phase seen '''
+        return {name: self.percentiles(name, qs) for name in self.samples}
+
+    def summary(self):
+        ''' one line of frame time stats for the status bar '''
+        parts = []
+        interval = self.percentiles('interval', (50, 99))
+        if interval[50]:
+            parts.append('%.0f fps' % (1000 / interval[50]))
+        frame = self.percentiles('frame', (50, 99))
+        parts.append('frame %.2f/%.2f ms (p50/p99)' % (frame[50], frame[99]))
+        for name in self.samples:
+            if name not in ('frame', 'interval'):
+                parts.append('%s %.2f' % (name,
+                                          self.percentiles(name, (50,))[50]))
+        return '  '.join(parts)
+
+    def trace(self):
+        ''' the recorded phases as a Chrome trace-event document '''
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = [{
+            'name': name,
+            'cat': 'frame',
+            'ph': 'X',
+            'ts': (start - self.origin) / 1000,
+            'dur': duration / 1000,
+            'pid': pid,
+            'tid': tid,
+            'args': {'frame': frame},
+        } for name, start, duration, frame in self.events]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path='trace.json'):
+        with open(path, 'w') as file:
+            json.dump(self.trace(), file)
+        return len(self.events)
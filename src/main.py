@@ -2,63 +2,39 @@
 Rubics Cube
 '''
 
-import random
-import math
-import copy
-import arcade
-
-
-def intersect_lines(p1x, p1y, p2x, p2y, p3x, p3y, p4x, p4y):
-
-    def ccw(ax, ay, bx, by, cx, cy):
-        return (cy - ay) * (bx - ax) > (by - ay) * (cx - ax)
-
-    return ccw(p1x, p1y, p3x, p3y, p4x, p4y) != ccw(
-        p2x, p2y, p3x, p3y, p4x, p4y) and ccw(
-            p1x, p1y, p2x, p2y, p3x, p3y) != ccw(p1x, p1y, p2x, p2y, p4x, p4y)
-
+import os
+import time
 
-BLUE = 0
-ORANGE = 1
-GREEN = 2
-RED = 3
-WHITE = 4
-YELLOW = 5
+import arcade
 
-sidename = ['BLUE', 'ORANGE', 'GREEN', 'RED', 'WHITE', 'YELLOW']
-sideneighbors = [[4, 3, 5, 1], [4, 0, 5, 2], [4, 1, 5, 3], [4, 2, 5, 0],
-                 [3, 0, 1, 2], [1, 0, 3, 2]]
-sideconnections = [[0, 5, 0, 3, 1, 7], [3, 0, 5, 0, 3, 3], [0, 3, 0, 5, 7, 1],
-                   [5, 0, 3, 0, 5, 5], [7, 7, 7, 7, 0, 0], [1, 1, 1, 1, 0, 0]]
-connectedfaces = [[], [0, 1, 2], [], [6, 3, 0], [], [2, 5, 8], [], [8, 7, 6],
-                  []]
+import animation
+import classify
+import instrument
+import picking
+import projection
+import raster
+import scramble
+import textures
+from cube import cubeinit, CubeState, CW, CCW, move_index, inverse_move
+from history import MoveHistory
+from moves import compile_moves, simplify
 
-cubeinit = [
-    '000000000', '111111111', '222222222', '333333333', '444444444',
-    '555555555'
-]
 
 sidecolors = [
     arcade.color.BLUE, arcade.color.ORANGE, arcade.color.GREEN,
     arcade.color.RED, arcade.color.WHITE, arcade.color.YELLOW
 ]
 
-perspective = 45
-
-rotation_default_direction = [-1, -1, 1, 1, 1, -1]
-rotation_direction = 1
-rotation_axis = [0, 2, 0, 2, 1, 1]
-rotation_angle = [0, 0, 0, 0, 0, 0]
-rotation_angle_step = 5
-rotation_side = -1
-animating = 0
+rotation_default_direction = projection.turn_direction
+turns_per_second = animation.DEFAULT_TURNS_PER_SECOND
 
 background_color = [210, 210, 220]
 
 
 class Page:
 
-    def __init__(self, width, height, overlay=True):
+    def __init__(self, width, height, overlay=True, texture_manager=None):
+        self.textures = texture_manager or textures.TextureManager()
         self.buttons = []
         self.color_buttons = []
         self.labels = []
@@ -81,9 +57,8 @@ class Page:
                    func,
                    tooltip=None,
                    enable_func=None):
-        tex = arcade.load_texture(image)
         self.buttons.append([
-            x, y, w, h, tex, func, tooltip,
+            x, y, w, h, image, func, tooltip,
             enable_func if enable_func else self.enable_default
         ])
 
@@ -96,7 +71,7 @@ class Page:
 
     def add_step(self, id, x, y, img, descrip):
         self.steps[id] = {'x': x, 'y': y,
-                          'texture': arcade.load_texture(img),
+                          'image': img,
                           'description': descrip}
 
     def draw(self):
@@ -107,7 +82,7 @@ class Page:
                                           b[1],
                                           b[2],
                                           b[3],
-                                          b[4],
+                                          self.textures.get(b[4]),
                                           alpha=alpha)
             if self.highlighted == b and b[7]():
                 arcade.draw_rectangle_outline(b[0], b[1], b[2], b[3],
@@ -131,7 +106,8 @@ class Page:
         if self.current_step != '':
             step = self.steps[self.current_step]
             arcade.draw_texture_rectangle(
-                step['x'], step['y'], 80, 80, step['texture'])
+                step['x'], step['y'], 80, 80,
+                self.textures.get(step['image']))
             arcade.draw_text(step['description'], step['x'] +
                              45, step['y']+40, arcade.color.BLACK, anchor_y='top', multiline=True, width=400)
 
@@ -158,14 +134,10 @@ class Game(arcade.Window):
     """ Main application class. """
 
     def __init__(self, width, height, title):
+        self.started = time.perf_counter()
         super().__init__(width, height, title)
 
-        self.cubepiece = [[0, 0, 0, 0, 0, 0, 0, 0, 0],
-                          [1, 1, 1, 1, 1, 1, 1, 1, 1],
-                          [2, 2, 2, 2, 2, 2, 2, 2, 2],
-                          [3, 3, 3, 3, 3, 3, 3, 3, 3],
-                          [4, 4, 4, 4, 4, 4, 4, 4, 4],
-                          [5, 5, 5, 5, 5, 5, 5, 5, 5]]
+        self.cube = CubeState()
 
         #
         arcade.set_background_color(background_color)
@@ -175,9 +147,12 @@ class Game(arcade.Window):
         self.status = self.status_default
 
         self.pages = []
+        # images load on first draw, shared between pages
+        self.textures = textures.TextureManager()
+        self.first_frame = None
 
         # add UI page 0
-        page = Page(width, height)
+        page = Page(width, height, texture_manager=self.textures)
         self.pages.append(page)
 
         page.add_button(30, 570, 30, 30, 'images/action-undo-8x.png',
@@ -220,7 +195,7 @@ class Game(arcade.Window):
         self.current_page = 0
 
         # help page
-        page = Page(width, height, False)
+        page = Page(width, height, False, self.textures)
         self.pages.append(page)
 
         page.add_button(570, 570, 20, 20, 'images/circle-x-8x.png',
@@ -241,13 +216,24 @@ class Game(arcade.Window):
             300, 320, arcade.color.BLACK, 12)
         page.add_label('Use Scroll wheel to zoom in and out.', 300, 300,
                        arcade.color.BLACK, 12)
-        page.add_label('Press R to randomize; I to initialize.', 300, 280,
+        page.add_label('Press R to randomize; I to initialize; S to solve.',
+                       300, 280,
                        arcade.color.BLACK, 12)
+        page.add_label(
+            'Ctrl+P shows frame timings, Ctrl+T saves them as a trace.json.',
+            300, 260, arcade.color.BLACK, 12)
+        page.add_label('Esc cancels queued turns, End finishes them at once.',
+                       300, 240, arcade.color.BLACK, 12)
         page.add_label('Author: Bhupendra Aole', 300, 100, arcade.color.BLACK,
                        15)
         page.add_label('Source: https://github.com/aole/Rubiks-Cube', 300, 75,
                        arcade.color.BLACK, 8)
 
+        # one file to decode for all icons, prepared while the window is
+        # set up; the first draw waits for it
+        self.textures.use_atlas([b[4] for p in self.pages for b in p.buttons],
+                                'images/icons.atlas.png')
+
         self.rotation_x = -20
         self.rotation_y = 210
         self.scale = 17
@@ -257,19 +243,30 @@ class Game(arcade.Window):
         self.left_mouse_down = False
         self.right_mouse_down = False
 
-        self.action_history = []
-        self.history_index = -1
+        self.history = MoveHistory(self.cube)
+        # loads on the first S press, None while its tables are built
+        self.solver = None
+        self.player = animation.MovePlayer(rotation_default_direction,
+                                           turns_per_second)
 
         self.show_text = True
 
-        self.polys_to_draw = []
+        self.quads = []
+        self.facing = []
+        self.draw_order = []
+        self.picker = None
         self.is_dirty = True
 
+        # frame timings, None while off
+        self.profiler = None
+        if os.environ.get('RUBIK_PROFILE'):
+            self.toggle_profiler()
+
     def enable_undo_button(self):
-        return self.history_index >= 0
+        return self.history.can_undo()
 
     def enable_redo_button(self):
-        return self.history_index < len(self.action_history) - 1
+        return self.history.can_redo()
 
     def show_blue(self):
         self.rotation_x = -20
@@ -309,35 +306,36 @@ class Game(arcade.Window):
             print('error in configuration:', configuration)
             return
 
-        side = 0
         for c in configuration:
             if len(c) != 9:
                 print('error in configuration:', configuration)
                 return
-            for i in range(9):
-                self.cubepiece[side][i] = int(c[i])
-
-            side += 1
 
+        self.player.cancel()
+        self.cube = CubeState.from_config(configuration)
+        self.history.reset(self.cube)
         self.derive_state()
 
+    @property
+    def cubepiece(self):
+        ''' a read only copy of the stickers, six 9 item tuples; assign
+        a whole new layout to change the cube '''
+        return tuple(tuple(face) for face in self.cube.faces())
+
+    @cubepiece.setter
+    def cubepiece(self, faces):
+        self.set_cube([''.join(str(c) for c in face) for face in faces])
+
     def jumble_cube(self):
-        self.action_history.clear()
-        self.history_index = -1
         self.state = 'Scambled'
-
-        for i in range(100):
-            side = random.choice(range(6))
-            if random.choice((True, False)):
-                self.rotate_side_ccw(side)
-            else:
-                self.rotate_side_cw(side)
+        self.player.cancel()
+        self.cube = CubeState(scramble.random_stickers())
+        self.history.reset(self.cube)
 
     def save_cube(self):
         file = open('session.cube', 'w')
-        for s in range(6):
-            for f in range(9):
-                file.write(str(self.cubepiece[s][f]))
+        for line in self.cube.to_config():
+            file.write(line)
             file.write('\n')
 
         file.close()
@@ -349,411 +347,167 @@ class Game(arcade.Window):
         file.close()
 
     def save_image(self):
-        self.show_text = False
-        self.on_draw()
-
-        image = arcade.get_image()
-        image.save('image.png', 'PNG')
-
-        self.show_text = True
-
-    def rotate(self, axis, cds, deg):
-        if axis == 0:
-            return self.rotatex(cds, deg)
-        elif axis == 1:
-            return self.rotatey(cds, deg)
-        elif axis == 2:
-            return self.rotatez(cds, deg)
-
-    def rotatex(self, cds, deg):
-        coords = copy.deepcopy(cds)
-        rad = math.radians(deg)
-        s = math.sin(rad)
-        c = math.cos(rad)
-        for i in range(9):
-            for j in range(4):
-                y = coords[i][j][1]
-                z = coords[i][j][2]
-                coords[i][j][1] = y * c - z * s  # y cos θ − z sin θ
-                coords[i][j][2] = y * s + z * c  # y sin θ + z cos θ
-
-        return coords
-
-    def rotatey(self, cds, deg):
-        coords = copy.deepcopy(cds)
-        rad = math.radians(deg)
-        s = math.sin(rad)
-        c = math.cos(rad)
-        for i in range(9):
-            for j in range(4):
-                x = coords[i][j][0]
-                z = coords[i][j][2]
-                coords[i][j][0] = x * c + z * s
-                coords[i][j][2] = -x * s + z * c
-
-        return coords
-
-    def rotatez(self, cds, deg):
-        coords = copy.deepcopy(cds)
-        rad = math.radians(deg)
-        s = math.sin(rad)
-        c = math.cos(rad)
-        for i in range(9):
-            for j in range(4):
-                x = coords[i][j][0]
-                y = coords[i][j][1]
-                coords[i][j][0] = x * c - y * s
-                coords[i][j][1] = x * s + y * c
-
-        return coords
-
-    def rotatep(self, axis, p, s, c):
-        if axis == 0:
-            return [p[0], p[1] * c - p[2] * s, p[1] * s + p[2] * c]
-        if axis == 1:
-            return [p[0] * c + p[2] * s, p[1], -p[0] * s + p[2] * c]
-        if axis == 2:
-            return [p[0] * c - p[1] * s, p[0] * s + p[1] * c, p[2]]
+        ''' the cube as seen now, rendered without the window '''
+        size = min(self.width, self.height)
+        raster.write_png('image.png', raster.render(
+            self.cube.stickers, self.rotation_x, self.rotation_y, self.scale,
+            size))
 
     def setup(self):
-        coords = []
-        # left face
-        size = 12
-        size2 = size / 2
-        size3 = size / 3
-        x = -size2
-        for y in range(3):
-            for z in range(3):
-                coords.append(
-                    [[x, -size2 + y * size3, -size2 + z * size3],
-                     [x, -size2 + y * size3, -size2 + z * size3 + size3],
-                     [x, -size2 + y * size3 + size3, -size2 + z * size3 + size3],
-                     [x, -size2 + y * size3 + size3, -size2 + z * size3]])
-
-        self.face_coords = []
-        self.face_coords.append(coords)
-
-        self.face_coords.append(self.rotatey(coords, -90))
-        self.face_coords.append(self.rotatey(coords, -180))
-        self.face_coords.append(self.rotatey(coords, -270))
-        self.face_coords.append(self.rotatez(coords, -90))
-        self.face_coords.append(self.rotatez(coords, 90))
+        self.face_coords = projection.face_geometry()
+        self.projection = projection.ProjectionCache(self.face_coords)
 
     def derive_state(self):
-        self.state = 'Scambled'
-        solved = True
-
-        # check white cross
-        s = WHITE
-        for i in range(1, 9, 2):
-            if self.cubepiece[s][i] != int(cubeinit[s][i]):
-                solved = False
-                break
-        if not solved:
-            # check daisy
-            s = YELLOW
-            for i in range(1, 9, 2):
-                if self.cubepiece[s][i] != int(cubeinit[WHITE][i]):
-                    return
-            self.state = 'Daisy'
-            return
-        self.state = 'White Cross'
-
-        # check first layer
-        s = WHITE
-        for i in range(9):
-            if self.cubepiece[s][i] != int(cubeinit[s][i]):
-                return
-        for s in range(6):  # check pieces connected to white
-            if s in (WHITE, YELLOW):
-                continue
-            for i in range(6, 8):
-                if self.cubepiece[s][i] != self.cubepiece[s][i+1]:
-                    return
-        self.state = 'Upper/white Layer'
-
-        # check middle layer
-        for s in range(6):
-            if s in (WHITE, YELLOW):
-                continue
-            for i in range(3, 6):
-                if self.cubepiece[s][i] != self.cubepiece[s][i+3]:
-                    return
-        self.state = 'Middle layer'
-
-        # check yellow cross
-        for s in range(6):
-            if s in (WHITE, YELLOW):
-                continue
-            # check middle and side piece
-            if self.cubepiece[s][1] != self.cubepiece[s][4]:
-                return
-        if not (YELLOW == self.cubepiece[YELLOW][1] == self.cubepiece[YELLOW][3] == self.cubepiece[YELLOW][5] == self.cubepiece[YELLOW][7]):
-            return
-        self.state = 'Yellow Cross'
-
-        # check all pieces
-        for s in range(6):
-            for i in range(9):
-                if self.cubepiece[s][i] != int(cubeinit[s][i]):
-                    return
-        self.state = 'Solved'
+        self.state = classify.stage_name(self.cube.stickers)
 
     def do_action(self, side, ccw=False):
-        action = str(side)
-        if ccw:
-            self.rotate_side_ccw(side)
-            action += 'cc'
-        else:
-            self.rotate_side_cw(side)
-            action += 'cw'
-
-        self.history_index += 1
-        if len(self.action_history) > self.history_index:
-            for i in range(
-                    len(self.action_history) - 1, self.history_index - 1, -1):
-                del self.action_history[i]
+        self.apply_move(move_index(side, CCW if ccw else CW))
+
+    def apply_move(self, move):
+        self.cube.apply(move)
 
         self.derive_state()
         print('State:', self.state)
-        self.action_history.append(action)
+        self.history.push(move)
 
-    def redo_last_action(self):
-        if self.history_index + 1 >= len(self.action_history):
-            return
+    def play(self, moves):
+        ''' animate a move sequence, e.g. a solution, recording it '''
+        self.player.extend(simplify(moves))
+        self.is_dirty = True
 
-        self.history_index += 1
-        action = self.action_history[self.history_index]
-        side = int(action[0])
-        if action[1:3] == 'cc':
-            self.rotate_side_ccw(side)
-        else:
-            self.rotate_side_cw(side)
+    def solve_cube(self):
+        ''' finish the queued turns, then animate a solution '''
+        self.skip_animation()
+        if self.solver is None:
+            import solver
+            self.solver = solver.try_solver()
+            if self.solver is None:
+                print('solver tables are being built, try again shortly')
+                return
+        try:
+            self.play(self.solver.solve_stickers(self.cube.stickers))
+        except ValueError as e:
+            print(e)
+
+    def skip_animation(self):
+        moves = self.player.skip_to_end()
+        if moves:
+            # the whole rest of the queue in one step
+            self.cube.apply_macro(compile_moves(moves))
+            self.history.extend(moves)
+            self.derive_state()
+            print('State:', self.state)
+        self.is_dirty = True
 
-    def undo_last_action(self):
-        if self.history_index < 0:
-            return
+    def cancel_animation(self):
+        self.player.cancel()
+        self.is_dirty = True
 
-        action = self.action_history[self.history_index]
-        self.history_index -= 1
+    def redo_last_action(self):
+        self.skip_animation()
+        move = self.history.redo()
+        if move is not None:
+            self.cube.apply(move)
 
-        side = int(action[0])
-        if action[1:3] == 'cc':
-            self.rotate_side_cw(side)
-        else:
-            self.rotate_side_ccw(side)
+    def undo_last_action(self):
+        self.skip_animation()
+        move = self.history.undo()
+        if move is not None:
+            self.cube.apply(inverse_move(move))
+
+    def seek_history(self, index):
+        ''' jump to the state after the first index recorded moves '''
+        self.player.cancel()
+        self.cube = self.history.seek(index)
+        self.derive_state()
 
-    def right_mouse_pressed(self, x, y, alt_press=False):
-        global rotation_direction, animating
+    def toggle_profiler(self):
+        self.profiler = None if self.profiler else instrument.FrameProfiler()
 
-        if animating > 0:
-            return
+    def save_trace(self, path='trace.json'):
+        if self.profiler:
+            count = self.profiler.write_trace(path)
+            print('wrote', count, 'trace events to', path)
 
-        found = False
-        for si in range(6):
-            # rotate the cube from initial orientation to display orientation
-            rc = self.rotatey(self.face_coords[si], self.rotation_y)
-            rc = self.rotatex(rc, self.rotation_x)
-            # using the middle face of the side
-            # use triangle orientation to find if the side is facing outwards
-            ax, ay, az = rc[4][0]
-            bx, by, bz = rc[4][1]
-            cx, cy, cz = rc[4][2]
-            crz = (ax - bx) * (cy - by) - (ay - by) * (cx - bx)
-            if crz > 0:  # side is facing out
-                # check each piece of the side of it intersects with mouse coords
-                for f in range(9):
-                    coords = []
-                    for i in range(4):
-                        coords.append([
-                            rc[f][i][0] * self.scale + self.translate_x,
-                            rc[f][i][1] * self.scale + self.translate_y
-                        ])
-
-                    # check if one of the sides intersections with a horizontal line on y
-                    # only 1 should intersect to be in the polygon.
-                    icounts = 0
-                    for p in range(4):
-                        p1 = coords[p - 1]
-                        p2 = coords[p]
-                        if intersect_lines(x, y, x+1000, y, coords[p-1][0],
-                                           coords[p-1][1], coords[p][0],
-                                           coords[p][1]):
-                            icounts += 1
-
-                    if icounts == 1:
-                        found = True
-                        break
-            if found:
-                break
+    def pick(self, x, y):
+        ''' (side, face) under x, y in the last rendered frame, or None '''
+        if self.picker is None:
+            self.picker = picking.QuadIndex(self.quads, self.facing,
+                                            self.draw_order)
+        return self.picker.pick(x, y)
 
+    def right_mouse_pressed(self, x, y, alt_press=False):
+        found = self.pick(x, y)
         if found:
+            si, f = found
             self.selected_side = si
             self.selected_face = f
             # if f==4: # center face
-            rotation_angle[si] = 90
-            rotation_direction = rotation_default_direction[si]
-            if alt_press:
-                rotation_direction *= -1
-            animating = 2
+            # turns queue up behind the one still animating
+            self.player.push(move_index(si, CCW if alt_press else CW))
 
     def rotate_side_ccw(self, side):
-        # rotate the side
-        tmp = self.cubepiece[side][0]
-        self.cubepiece[side][0] = self.cubepiece[side][2]
-        self.cubepiece[side][2] = self.cubepiece[side][8]
-        self.cubepiece[side][8] = self.cubepiece[side][6]
-        self.cubepiece[side][6] = tmp
-        tmp = self.cubepiece[side][1]
-        self.cubepiece[side][1] = self.cubepiece[side][5]
-        self.cubepiece[side][5] = self.cubepiece[side][7]
-        self.cubepiece[side][7] = self.cubepiece[side][3]
-        self.cubepiece[side][3] = tmp
-        # rotate one for of each neighboring side
-        lastside = sideneighbors[side][-1]
-        sideconind = sideconnections[side][
-            lastside]  # which row to rotate / connected row
-        tcf = connectedfaces[sideconind]
-        tn6, tn7, tn8 = self.cubepiece[lastside][tcf[0]], self.cubepiece[
-            lastside][tcf[1]], self.cubepiece[lastside][tcf[2]]
-        for n in sideneighbors[side]:
-            sideconind = sideconnections[side][
-                n]  # which row to rotate / connected row
-            tcf = connectedfaces[sideconind]
-            self.cubepiece[n][tcf[0]], tn6 = tn6, self.cubepiece[n][tcf[0]]
-            self.cubepiece[n][tcf[1]], tn7 = tn7, self.cubepiece[n][tcf[1]]
-            self.cubepiece[n][tcf[2]], tn8 = tn8, self.cubepiece[n][tcf[2]]
+        self.cube.rotate_ccw(side)
 
     def rotate_side_cw(self, side):
-        # rotate the side
-        tmp = self.cubepiece[side][6]
-        self.cubepiece[side][6] = self.cubepiece[side][8]
-        self.cubepiece[side][8] = self.cubepiece[side][2]
-        self.cubepiece[side][2] = self.cubepiece[side][0]
-        self.cubepiece[side][0] = tmp
-        tmp = self.cubepiece[side][3]
-        self.cubepiece[side][3] = self.cubepiece[side][7]
-        self.cubepiece[side][7] = self.cubepiece[side][5]
-        self.cubepiece[side][5] = self.cubepiece[side][1]
-        self.cubepiece[side][1] = tmp
-        # rotate one for of each neighboring side
-        lastside = sideneighbors[side][0]
-        sideconind = sideconnections[side][
-            lastside]  # which row to rotate / connected row
-        tcf = connectedfaces[sideconind]
-        tn6, tn7, tn8 = self.cubepiece[lastside][tcf[0]], self.cubepiece[
-            lastside][tcf[1]], self.cubepiece[lastside][tcf[2]]
-        for n in reversed(sideneighbors[side]):
-            sideconind = sideconnections[side][
-                n]  # which row to rotate / connected row
-            tcf = connectedfaces[sideconind]
-            self.cubepiece[n][tcf[0]], tn6 = tn6, self.cubepiece[n][tcf[0]]
-            self.cubepiece[n][tcf[1]], tn7 = tn7, self.cubepiece[n][tcf[1]]
-            self.cubepiece[n][tcf[2]], tn8 = tn8, self.cubepiece[n][tcf[2]]
-
-    class PolyToDraw:
-
-        def __init__(self, z, coords, color, piece):
-            self.z = z
-            self.coords = coords
-            self.color = color
-            self.piece = piece
+        self.cube.rotate_cw(side)
 
     def update(self, delta_time):
-        global rotation_angle, animating, rotation_side
+        profiler = self.profiler
+        if profiler:
+            profiler.begin('update')
+        self.update_geometry(delta_time)
+        if profiler:
+            profiler.end('update')
+
+    def update_geometry(self, delta_time):
+        # turns advance with real time, even while the cube is not shown
+        for move in self.player.update(delta_time):
+            self.apply_move(move)
+            self.is_dirty = True
 
-        if self.pages[self.current_page].overlay and self.is_dirty:
+        if self.pages[self.current_page].overlay and (self.is_dirty or
+                                                      self.player.busy):
 
-            self.is_dirty = animating > 0
+            self.is_dirty = False
+            layers = self.player.layers()
 
             # draw Cube
-            self.polys_to_draw.clear()
-            rotated = []
-
-            # rotate for animation
-            if animating == 1:
-                self.do_action(
-                    rotation_side, rotation_direction !=
-                    rotation_default_direction[rotation_side])
-                animating = 0
-
-            for side in range(6):
-                if rotation_angle[side] == 0:
-                    rotated.append(copy.deepcopy(self.face_coords[side]))
-                else:
-                    rotated.append(
-                        self.rotate(
-                            rotation_axis[side], self.face_coords[side],
-                            (90 - rotation_angle[side]) * rotation_direction))
-
-            for side in range(6):
-                if rotation_angle[side] == 0:
-                    continue
-                rad = math.radians(
-                    (90 - rotation_angle[side]) * rotation_direction)
-                sn = math.sin(rad)
-                cs = math.cos(rad)
-                for n in sideneighbors[side]:
-                    sideconind = sideconnections[side][n]
-                    cfs = connectedfaces[sideconind]
-                    for cf in cfs:
-                        for p in rotated[n][cf]:
-                            p[0], p[1], p[2] = self.rotatep(
-                                rotation_axis[side], p, sn, cs)
-                rotation_angle[side] -= rotation_angle_step
-                if rotation_angle[side] == 0:
-                    animating = 1
-                    rotation_side = side
-
-            for si in range(6):
-                # rotate the cube
-                rc = self.rotatey(rotated[si], self.rotation_y)
-                rc = self.rotatex(rc, self.rotation_x)
-                faces = self.cubepiece[si]
-                for f in range(9):
-                    # which direction is the side facing
-                    # using the middle face of the side
-                    ax, ay, az = rc[f][0]
-                    bx, by, bz = rc[f][1]
-                    cx, cy, cz = rc[f][2]
-
-                    az = (perspective - az) / perspective
-                    bz = (perspective - bz) / perspective
-                    cz = (perspective - cz) / perspective
-                    crz = (ax * az - bx * bz) * (cy * cz - by * bz) - (
-                        ay * az - by * bz) * (cx * cz - bx * bz)
-                    coords = []
-                    avgz = 0
-                    for i in range(4):
-                        avgz += rc[f][i][2]
-                        z = (perspective - rc[f][i][2]) / perspective
-                        coords.append([
-                            rc[f][i][0] * self.scale * z + self.translate_x,
-                            rc[f][i][1] * self.scale * z + self.translate_y
-                        ])
-
-                    if crz > 0:
-                        self.polys_to_draw.append(
-                            Game.PolyToDraw(avgz / 4, coords,
-                                            sidecolors[faces[f]], f))
-                    else:  # display backfaces as black
-                        self.polys_to_draw.append(
-                            Game.PolyToDraw(avgz / 4, coords,
-                                            arcade.color.BLACK, f))
+            frame = self.projection.get(self.rotation_x, self.rotation_y,
+                                        self.scale, self.translate_x,
+                                        self.translate_y, layers)
+            if frame.quads is not self.quads:
+                self.quads, self.facing, self.draw_order = frame
+                self.picker = None
 
     def on_draw(self):
+        profiler = self.profiler
+        if profiler:
+            profiler.begin_frame()
         arcade.start_render()
 
+        if profiler:
+            profiler.begin('page')
         self.pages[self.current_page].draw()
+        if profiler:
+            profiler.end('page')
 
+        if profiler:
+            profiler.begin('polygons')
         if self.pages[self.current_page].overlay:
+            stickers = self.cube.stickers
             # render polygons back to front (based on z depth)
-            for p in sorted(self.polys_to_draw, key=lambda x: x.z, reverse=True):
-                # for p in self.polys_to_draw:
-                if p.color != arcade.color.BLACK or animating:  # do not draw back polys
-                    arcade.draw_polygon_filled(p.coords, p.color)
-                    arcade.draw_polygon_outline(p.coords, arcade.color.BLACK)
-                    # arcade.draw_text(f'{p.piece}', p.coords[0][0], p.coords[0][1])
+            for i in self.draw_order:
+                if self.facing[i]:
+                    color = sidecolors[stickers[i]]
+                elif self.player.busy:  # display backfaces as black
+                    color = arcade.color.BLACK
+                else:  # do not draw back polys
+                    continue
+                arcade.draw_polygon_filled(self.quads[i], color)
+                arcade.draw_polygon_outline(self.quads[i], arcade.color.BLACK)
+        if profiler:
+            profiler.end('polygons')
 
         # draw status bar
         status_text = self.status if self.status else self.status_default
@@ -765,6 +519,23 @@ class Game(arcade.Window):
                          align="left",
                          anchor_x="left",
                          anchor_y="bottom")
+        if profiler:
+            arcade.draw_text(profiler.summary(),
+                             5,
+                             20, [0, 0, 0, 150],
+                             10,
+                             width=600,
+                             align="left",
+                             anchor_x="left",
+                             anchor_y="bottom")
+            profiler.end_frame()
+
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - self.started
+            stats = self.textures.stats()
+            print('first frame after %.0f ms (%d textures from %d files in '
+                  '%.0f ms)' % (self.first_frame * 1000, stats['textures'],
+                                stats['files_decoded'], stats['load_ms']))
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.Z and modifiers & arcade.key.MOD_CTRL and modifiers & arcade.key.MOD_SHIFT:
@@ -779,8 +550,18 @@ class Game(arcade.Window):
             self.init_cube()
         elif key == arcade.key.S and modifiers & arcade.key.MOD_CTRL:
             self.save_cube()
+        elif key == arcade.key.S:
+            self.solve_cube()
         elif key == arcade.key.O and modifiers & arcade.key.MOD_CTRL:
             self.load_cube()
+        elif key == arcade.key.P and modifiers & arcade.key.MOD_CTRL:
+            self.toggle_profiler()
+        elif key == arcade.key.T and modifiers & arcade.key.MOD_CTRL:
+            self.save_trace()
+        elif key == arcade.key.ESCAPE:
+            self.cancel_animation()
+        elif key == arcade.key.END:
+            self.skip_animation()
 
         self.is_dirty = True
 
@@ -0,0 +1,127 @@
+'''
+Move sequences: Singmaster notation, simplification, inversion and
+compilation into a single sticker permutation.
+
+Letters name sides as the Game shows them, WHITE on top with RED front
+left and BLUE front right:
+
+    U WHITE (4)   D YELLOW (5)   F RED (3)   B ORANGE (1)
+    R BLUE (0)    L GREEN (2)
+
+With these names every 'cw' move of cube.py is clockwise seen from its
+face, so R is 0cw, R' is 0cc and R2 is 0ht; the Game animates R with the
+angle sign main.rotation_default_direction[0]. History style names like
+'0cw' are accepted too.
+'''
+
+import re
+from functools import lru_cache
+
+from cube import (CCW, CW, HALF, MOVES, SOLVED_LOCATIONS, apply_permutation,
+                  compose, invert, inverse_move, move_index)
+
+side_letter = 'RBLFUD'
+turn_suffix = {CW: '', HALF: '2', CCW: "'"}
+# opposite sides share an axis and commute
+axis = [0, 1, 0, 1, 2, 2]
+
+_token = re.compile(r"\s*(?:([RBLFUD])(2'?|'|)|([0-5])(cw|ht|cc))")
+_turns = {'': CW, '2': HALF, "2'": HALF, "'": CCW}
+_history_turns = {'cw': CW, 'ht': HALF, 'cc': CCW}
+
+
+def parse(text):
+    ''' move indices of "R U R' U'", "RUR'U'" or "0cw 4cw 0cc 4cc" '''
+    moves = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _token.match(text, pos)
+        if m is None:
+            raise ValueError('bad move at %r' % text[pos:].strip())
+        letter, suffix, side, turn = m.groups()
+        if letter:
+            moves.append(move_index(side_letter.index(letter),
+                                    _turns[suffix]))
+        else:
+            moves.append(move_index(int(side), _history_turns[turn]))
+        pos = m.end()
+    return moves
+
+
+def name(move):
+    return side_letter[move // 3] + turn_suffix[move % 3]
+
+
+def format_moves(moves):
+    return ' '.join(name(m) for m in moves)
+
+
+def inverse(moves):
+    ''' the sequence undoing moves '''
+    return [inverse_move(m) for m in reversed(moves)]
+
+
+def simplify(moves):
+    '''
+    Shortest equivalent of moves without changing the order of axes:
+    turns of one side merge or cancel, also across turns of the opposite
+    side in between (R L R' is L), and a cancellation lets what it
+    separated meet (R U U' R' is nothing).
+    '''
+    out = []
+    for m in moves:
+        side = m // 3
+        quarters = m % 3 + 1
+        # the trailing run on this axis holds at most one turn per side
+        i = len(out) - 1
+        while i >= 0 and axis[out[i] // 3] == axis[side]:
+            if out[i] // 3 == side:
+                quarters = (quarters + out[i] % 3 + 1) % 4
+                if quarters:
+                    out[i] = side * 3 + quarters - 1
+                else:
+                    del out[i]
+                break
+            i -= 1
+        else:
+            out.append(m)
+    return out
+
+
+class Macro:
+    ''' A move sequence compiled into one 54 sticker permutation. '''
+
+    __slots__ = ('moves', 'perm', 'locate')
+
+    def __init__(self, moves):
+        self.moves = tuple(moves)
+        perm = tuple(range(54))
+        for m in self.moves:
+            perm = compose(perm, MOVES[m])
+        # gather form for sticker buffers, as MOVES
+        self.perm = perm
+        # translate form for CubeState.where, as cube._LOCATE
+        self.locate = bytes(invert(perm)) + bytes(256 - 54)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def apply(self, stickers):
+        ''' stickers after the whole sequence, one gather '''
+        return apply_permutation(stickers, self.perm)
+
+    def is_identity(self):
+        return self.locate.startswith(SOLVED_LOCATIONS)
+
+
+@lru_cache(maxsize=1024)
+def _compile(moves):
+    return Macro(moves)
+
+
+def compile_moves(moves):
+    ''' shared Macro of a sequence, or of its notation string '''
+    if isinstance(moves, str):
+        moves = parse(moves)
+    return _compile(tuple(simplify(moves)))
@@ -0,0 +1,188 @@
+'''
+Cubes of any size, 2x2 and up.
+
+Stickers are numbered side * n * n + face like the 3x3, face running over
+the rows of projection.face_geometry(n=n). A move turns the layer at some
+depth (0 is the side itself, n - 1 the far side) a quarter, half or
+reverse quarter turn; moves are numbered (side * n + depth) * 3 + turn.
+
+The move permutations are generated from the sticker geometry instead of
+neighbour tables: a layer is rotated in space the way Game animates it and
+every sticker lands on another one. For n = 3 the outer turns give exactly
+cube.MOVES.
+'''
+
+from operator import itemgetter
+
+import numpy as np
+
+import projection
+from cube import CCW, CW, HALF, compose, invert, turnname
+
+
+def _layer_depths(centers, n, size):
+    ''' depth of every sticker in the layers of every side, (6, 6 n n) '''
+    normals = centers.reshape(6, -1, 3).mean(axis=1)
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    t = centers @ normals.T
+    depth = np.floor((size / 2 - t) / (size / n) + 1e-6).astype(int)
+    return np.clip(depth, 0, n - 1).T
+
+
+def _quarter_turn(centers, rounding, layer, side):
+    rot = projection.rotation_matrix(projection.rotation_axis[side],
+                                     90 * projection.turn_direction[side])
+    index = {tuple(c): i for i, c in enumerate(rounding(centers))}
+    perm = list(range(len(centers)))
+    moved = rounding(centers[layer] @ rot.T)
+    for i, c in zip(layer, moved):
+        # gather: the slot the sticker lands on takes it from its old slot
+        perm[index[tuple(c)]] = i
+    return tuple(perm)
+
+
+class Puzzle:
+    ''' Move tables of one cube size. '''
+
+    def __init__(self, n, size=12):
+        if n < 2:
+            raise ValueError('cubes start at 2x2, got %d' % n)
+        self.n = n
+        self.face_count = n * n
+        self.sticker_count = 6 * n * n
+        self.geometry = projection.face_geometry(size, n)
+        centers = self.geometry.reshape(-1, 4, 3).mean(axis=1)
+        # sticker centers sit on a half step grid
+        step = size / n / 2
+
+        def rounding(points):
+            return np.rint(points / step).astype(int)
+
+        depths = _layer_depths(centers, n, size)
+        self.layers = [[np.flatnonzero(depths[side] == d) for d in range(n)]
+                       for side in range(6)]
+        self.moves = []
+        for side in range(6):
+            for d in range(n):
+                cw = _quarter_turn(centers, rounding, self.layers[side][d],
+                                   side)
+                self.moves += [cw, compose(cw, cw), invert(cw)]
+        self.num_moves = len(self.moves)
+        self._gather = [itemgetter(*p) for p in self.moves]
+        self._arrays = np.array(self.moves, dtype=np.intp)
+        self.solved = bytes(s for s in range(6)
+                            for _ in range(self.face_count))
+
+    def move_index(self, side, depth=0, turn=CW):
+        return (side * self.n + depth) * 3 + turn
+
+    def move_name(self, move):
+        ''' '3cw' for outer turns, '3:1cw' for the layer one deeper '''
+        layer, turn = divmod(move, 3)
+        side, depth = divmod(layer, self.n)
+        if depth:
+            return '%d:%d%s' % (side, depth, turnname[turn])
+        return '%d%s' % (side, turnname[turn])
+
+    def parse_move(self, name):
+        head, turn = name[:-2], turnname.index(name[-2:])
+        side, _, depth = head.partition(':')
+        return self.move_index(int(side), int(depth or 0), turn)
+
+    def inverse_move(self, move):
+        return move - move % 3 + 2 - move % 3
+
+    def layer_stickers(self, side, depth=0):
+        ''' sticker indices turning with a layer, see ProjectionCache '''
+        return self.layers[side][depth]
+
+    def apply(self, stickers, move):
+        return bytes(self._gather[move](stickers))
+
+    def sequence_permutation(self, moves):
+        ''' one gather permutation for a whole move sequence '''
+        perm = np.arange(self.sticker_count)
+        for m in moves:
+            perm = perm[self._arrays[m]]
+        return perm
+
+    def apply_batch(self, states, moves):
+        ''' apply the same move sequence to every row of (N, 6 n n) states '''
+        return np.take(states, self.sequence_permutation(moves), axis=1)
+
+    def apply_rows(self, states, moves):
+        ''' apply moves[i] to row i, in place '''
+        moves = np.asarray(moves)
+        for m in np.unique(moves):
+            rows = np.flatnonzero(moves == m)
+            states[rows] = states[rows][:, self._arrays[m]]
+        return states
+
+    def solved_batch(self, count):
+        return np.tile(np.frombuffer(self.solved, dtype=np.uint8), (count, 1))
+
+
+_puzzles = {}
+
+
+def puzzle(n):
+    ''' shared move tables of the n x n cube '''
+    p = _puzzles.get(n)
+    if p is None:
+        p = _puzzles[n] = Puzzle(n)
+    return p
+
+
+class NxNState:
+    ''' One n x n cube as a flat sticker buffer. '''
+
+    __slots__ = ('puzzle', 'stickers')
+
+    def __init__(self, n=3, stickers=None):
+        self.puzzle = puzzle(n)
+        if stickers is None:
+            stickers = self.puzzle.solved
+        self.stickers = bytes(stickers)
+        if len(self.stickers) != self.puzzle.sticker_count:
+            raise ValueError('a %dx%d cube has %d stickers, got %d' % (
+                n, n, self.puzzle.sticker_count, len(self.stickers)))
+
+    @property
+    def n(self):
+        return self.puzzle.n
+
+    def copy(self):
+        c = NxNState.__new__(NxNState)
+        c.puzzle = self.puzzle
+        c.stickers = self.stickers
+        return c
+
+    def apply(self, move):
+        self.stickers = bytes(self.puzzle._gather[move](self.stickers))
+
+    def apply_moves(self, moves):
+        gather = self.puzzle._gather
+        s = self.stickers
+        for m in moves:
+            s = gather[m](s)
+        self.stickers = bytes(s)
+
+    def turn(self, side, depth=0, turn=CW):
+        self.apply(self.puzzle.move_index(side, depth, turn))
+
+    def rotate_cw(self, side, depth=0):
+        self.turn(side, depth, CW)
+
+    def rotate_ccw(self, side, depth=0):
+        self.turn(side, depth, CCW)
+
+    def rotate_half(self, side, depth=0):
+        self.turn(side, depth, HALF)
+
+    def faces(self):
+        s = self.stickers
+        k = self.puzzle.face_count
+        return [list(s[i:i + k]) for i in range(0, len(s), k)]
+
+    def is_solved(self):
+        return all(len(set(face)) == 1 for face in self.faces())
@@ -0,0 +1,137 @@
+'''
+Packed cube states: 54 stickers x 3 bits in one 162 bit integer, sticker i
+in bits 3i .. 3i + 2.
+
+PackedState wraps that integer as a small hashable object for sets and
+dicts. pack_many / unpack_many do the same for (N, 54) arrays, as three
+uint64 words per state (21 stickers per word).
+'''
+
+import numpy as np
+
+from cube import SOLVED
+
+_PAD = bytes(64 - 54)
+
+
+def _lane_masks():
+    # fold 8 bit lanes holding 3 bits into ever wider lanes, doubling the
+    # bits kept per lane each step (the usual parallel bit extract)
+    steps = []
+    lane = 8
+    bits = 3
+    while lane < 512:
+        low = high = 0
+        for start in range(0, 512, lane * 2):
+            low |= ((1 << bits) - 1) << start
+            high |= ((1 << bits) - 1) << (start + lane)
+        steps.append((low, high, lane - bits))
+        lane *= 2
+        bits *= 2
+    return steps
+
+
+_steps = _lane_masks()
+
+
+def pack(stickers):
+    ''' 54 sticker colors to a 162 bit integer '''
+    x = int.from_bytes(bytes(stickers) + _PAD, 'little')
+    for low, high, shift in _steps:
+        x = (x & low) | ((x & high) >> shift)
+    return x
+
+
+def unpack(value):
+    ''' 162 bit integer back to 54 sticker bytes '''
+    x = value
+    for low, high, shift in reversed(_steps):
+        x = (x & low) | ((x << shift) & high)
+    return x.to_bytes(64, 'little')[:54]
+
+
+def from_cubepiece(cubepiece):
+    return pack(c for side in cubepiece for c in side)
+
+
+def to_cubepiece(value):
+    s = unpack(value)
+    return [list(s[i:i + 9]) for i in range(0, 54, 9)]
+
+
+class PackedState:
+    ''' A hashable, immutable cube state. '''
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    @classmethod
+    def from_stickers(cls, stickers):
+        return cls(pack(stickers))
+
+    @classmethod
+    def from_cubepiece(cls, cubepiece):
+        return cls(from_cubepiece(cubepiece))
+
+    @property
+    def stickers(self):
+        return unpack(self.value)
+
+    def cubepiece(self):
+        return to_cubepiece(self.value)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __eq__(self, other):
+        if not isinstance(other, PackedState):
+            return NotImplemented
+        return self.value == other.value
+
+    def __lt__(self, other):
+        if not isinstance(other, PackedState):
+            return NotImplemented
+        return self.value < other.value
+
+    def __repr__(self):
+        return 'PackedState(0x%041x)' % self.value
+
+
+SOLVED_PACKED = pack(SOLVED)
+
+_shifts = (np.arange(21, dtype=np.uint64) * np.uint64(3))
+
+
+def pack_many(states):
+    ''' (N, 54) uint8 states to (N, 3) uint64 words '''
+    states = np.asarray(states, dtype=np.uint8)
+    padded = np.zeros((len(states), 63), dtype=np.uint64)
+    padded[:, :54] = states
+    words = padded.reshape(-1, 3, 21) << _shifts
+    return np.bitwise_or.reduce(words, axis=2)
+
+
+def unpack_many(words):
+    ''' (N, 3) uint64 words back to (N, 54) uint8 states '''
+    words = np.asarray(words, dtype=np.uint64)
+    lanes = (words[:, :, None] >> _shifts) & np.uint64(7)
+    return lanes.reshape(-1, 63)[:, :54].astype(np.uint8)
+
+
+def keys(words):
+    ''' one sortable, hashable void scalar per packed row '''
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return words.view(np.dtype((np.void, 24))).reshape(-1)
+
+
+def unique_states(states):
+    ''' distinct rows of an (N, 54) array, via their packed words '''
+    words = np.unique(keys(pack_many(states)))
+    return unpack_many(words.view(np.uint64).reshape(-1, 3))
+
+
+def to_int(words):
+    ''' the pack() integer of one row of words '''
+    return int(words[0]) | int(words[1]) << 63 | int(words[2]) << 126
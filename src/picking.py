@@ -0,0 +1,90 @@
+'''
+Face picking from the screen space quads of the last rendered frame.
+
+Quads are dropped into a small uniform grid laid over their bounding box,
+so a lookup only tests the one or two quads under the cursor no matter
+how far the cube is zoomed in.
+'''
+
+GRID_CELLS = 8
+
+
+def inside_convex(quad, x, y):
+    ''' point in convex polygon, either winding '''
+    sign = 0
+    n = len(quad)
+    for i in range(n):
+        ax, ay = quad[i - 1]
+        bx, by = quad[i]
+        cross = (bx - ax) * (y - ay) - (by - ay) * (x - ax)
+        if cross > 0:
+            if sign < 0:
+                return False
+            sign = 1
+        elif cross < 0:
+            if sign > 0:
+                return False
+            sign = -1
+    return True
+
+
+class QuadIndex:
+    ''' Grid index over the front facing quads of one frame. '''
+
+    def __init__(self, quads, facing, order=None, cells=GRID_CELLS):
+        order = range(len(quads)) if order is None else order
+        # later in paint order is on top
+        self.rank = {}
+        for r, i in enumerate(order):
+            self.rank[i] = r
+        self.quads = quads
+        self.cells = cells
+        self.grid = {}
+
+        visible = [i for i in range(len(quads)) if facing[i]]
+        if not visible:
+            self.x0 = self.y0 = 0
+            self.cw = self.ch = 1
+            return
+        xs = [p[0] for i in visible for p in quads[i]]
+        ys = [p[1] for i in visible for p in quads[i]]
+        self.x0 = min(xs)
+        self.y0 = min(ys)
+        self.cw = (max(xs) - self.x0) / cells or 1
+        self.ch = (max(ys) - self.y0) / cells or 1
+
+        for i in visible:
+            qx = [p[0] for p in quads[i]]
+            qy = [p[1] for p in quads[i]]
+            c0, r0 = self._cell(min(qx), min(qy))
+            c1, r1 = self._cell(max(qx), max(qy))
+            for c in range(c0, c1 + 1):
+                for r in range(r0, r1 + 1):
+                    self.grid.setdefault((c, r), []).append(i)
+
+    def _cell(self, x, y):
+        c = int((x - self.x0) / self.cw)
+        r = int((y - self.y0) / self.ch)
+        return (min(max(c, 0), self.cells - 1),
+                min(max(r, 0), self.cells - 1))
+
+    def pick_index(self, x, y):
+        ''' flat sticker index under x, y or None '''
+        if x < self.x0 or y < self.y0:
+            return None
+        c = int((x - self.x0) / self.cw)
+        r = int((y - self.y0) / self.ch)
+        if c > self.cells or r > self.cells:
+            return None
+        best = None
+        for i in self.grid.get((min(c, self.cells - 1),
+                                min(r, self.cells - 1)), ()):
+            if inside_convex(self.quads[i], x, y):
+                if best is None or self.rank[i] > self.rank[best]:
+                    best = i
+        return best
+
+    def pick(self, x, y):
+        ''' (side, face) under x, y or None '''
+        i = self.pick_index(x, y)
+        return None if i is None else (i // 9, i % 9)
@@ -0,0 +1,193 @@
+'''
+Array based sticker geometry and projection.
+
+The cube is held as one (6, n * n, 4, 3) array of sticker corners built
+the same way Game.setup always did (n = 3 there). A frame is the animating
+layer rotation, the view rotation and the perspective divide applied to
+the whole array at once.
+'''
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from cube import sideneighbors, sideconnections, connectedfaces
+
+perspective = 45
+
+rotation_axis = [0, 2, 0, 2, 1, 1]
+# sign of the layer angle that turns each side clockwise
+turn_direction = [-1, -1, 1, 1, 1, -1]
+
+
+def rotation_matrix(axis, deg):
+    ''' matrix of Game.rotatex / rotatey / rotatez for column vectors '''
+    rad = math.radians(deg)
+    s = math.sin(rad)
+    c = math.cos(rad)
+    if axis == 0:
+        return np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+    if axis == 1:
+        return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+    return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+
+def view_matrix(rotation_x, rotation_y):
+    ''' rotate around y first, then around x '''
+    return rotation_matrix(0, rotation_x) @ rotation_matrix(1, rotation_y)
+
+
+def face_geometry(size=12, n=3):
+    ''' (6, n * n, 4, 3) corners of every sticker of an n x n cube '''
+    size2 = size / 2
+    size3 = size / n
+    x = -size2
+    left = []
+    for y in range(n):
+        for z in range(n):
+            y0 = -size2 + y * size3
+            z0 = -size2 + z * size3
+            left.append([[x, y0, z0], [x, y0, z0 + size3],
+                         [x, y0 + size3, z0 + size3], [x, y0 + size3, z0]])
+    left = np.array(left, dtype=np.float64)
+
+    sides = [left]
+    for axis, deg in ((1, -90), (1, -180), (1, -270), (2, -90), (2, 90)):
+        sides.append(left @ rotation_matrix(axis, deg).T)
+    return np.array(sides)
+
+
+def _layer_stickers(side):
+    stickers = [side * 9 + f for f in range(9)]
+    for n in sideneighbors[side]:
+        for f in connectedfaces[sideconnections[side][n]]:
+            stickers.append(n * 9 + f)
+    return np.array(stickers)
+
+
+# flat sticker indices that move with each side turn
+layer_stickers = [_layer_stickers(side) for side in range(6)]
+
+
+def transform(geometry, rotation_x, rotation_y, layers=()):
+    '''
+    Rotate the (6, 9, 4, 3) geometry into view space, returned as (54, 4, 3).
+    layers is a sequence of (side, degrees) for turning layers. Other sizes
+    work the same without layers.
+    '''
+    points = geometry.reshape(-1, 4, 3)
+    view = view_matrix(rotation_x, rotation_y)
+    out = points @ view.T
+    for side, deg in layers:
+        idx = layer_stickers[side]
+        m = view @ rotation_matrix(rotation_axis[side], deg)
+        out[idx] = points[idx] @ m.T
+    return out
+
+
+def project(points, scale, translate_x, translate_y):
+    '''
+    Perspective divide of (N, 4, 3) view space quads. Returns screen
+    coordinates (N, 4, 2), mean depth (N,) and whether each quad faces
+    the viewer (N,).
+    '''
+    zf = (perspective - points[..., 2]) / perspective
+    px = points[..., 0] * zf
+    py = points[..., 1] * zf
+    # winding of the first three corners, as seen after the divide
+    crz = (px[:, 0] - px[:, 1]) * (py[:, 2] - py[:, 1]) - (
+        py[:, 0] - py[:, 1]) * (px[:, 2] - px[:, 1])
+    screen = np.empty(points.shape[:-1] + (2,))
+    screen[..., 0] = px * scale + translate_x
+    screen[..., 1] = py * scale + translate_y
+    return screen, points[..., 2].mean(axis=1), crz > 0
+
+
+def draw_order(depth):
+    ''' back to front, the order on_draw paints quads in '''
+    return np.argsort(-depth, kind='stable')
+
+
+def _slices(side):
+    ''' stickers of the three layers parallel to side, side first '''
+    far = next(s for s in range(6)
+               if s != side and s not in sideneighbors[side])
+    near = layer_stickers[side]
+    back = layer_stickers[far]
+    middle = np.setdiff1d(np.arange(54), np.concatenate([near, back]))
+    return near, middle, back
+
+
+# layer_stickers by depth: the side, the middle slice and the far side
+slice_stickers = [_slices(side) for side in range(6)]
+
+
+def _cube_layer(side, depth):
+    return slice_stickers[side][depth]
+
+
+# what on_draw needs: lists of screen quads, facing flags and paint order
+Frame = namedtuple('Frame', 'quads facing order')
+
+
+class ProjectionCache:
+    '''
+    Projected quads keyed on the view (rotation_x, rotation_y, scale,
+    translate_x, translate_y). Sticker colors are not part of the geometry,
+    so recoloring reuses the cached frame. While a layer turns only its 21
+    stickers are projected again on top of the cached still frame.
+
+    layers are (side, degrees) or (side, degrees, depth). For other cube
+    sizes pass layer_stickers(side, depth), the sticker indices turning with
+    that layer; the default knows the three layers of the 3x3.
+    '''
+
+    def __init__(self, geometry, layer_stickers=None):
+        self.points = geometry.reshape(-1, 4, 3)
+        self.layer_stickers = layer_stickers or _cube_layer
+        self.key = None
+        self.frames = 0
+        self.hits = 0
+        self.full_updates = 0
+        self.layer_updates = 0
+
+    def get(self, rotation_x, rotation_y, scale, translate_x, translate_y,
+            layers=()):
+        self.frames += 1
+        key = (rotation_x, rotation_y, scale, translate_x, translate_y)
+        if key != self.key:
+            self.full_updates += 1
+            self.key = key
+            self.view = view_matrix(rotation_x, rotation_y)
+            self.arrays = project(self.points @ self.view.T, scale,
+                                  translate_x, translate_y)
+            quads, depth, facing = self.arrays
+            self.still = Frame(quads.tolist(), facing.tolist(),
+                               draw_order(depth).tolist())
+        elif not layers:
+            self.hits += 1
+
+        if not layers:
+            return self.still
+
+        self.layer_updates += 1
+        quads, depth, facing = (a.copy() for a in self.arrays)
+        for layer in layers:
+            side, deg = layer[:2]
+            idx = self.layer_stickers(side, layer[2] if len(layer) > 2 else 0)
+            m = self.view @ rotation_matrix(rotation_axis[side], deg)
+            quads[idx], depth[idx], facing[idx] = project(
+                self.points[idx] @ m.T, scale, translate_x, translate_y)
+        return Frame(quads.tolist(), facing.tolist(),
+                     draw_order(depth).tolist())
+
+    def stats(self):
+        frames = self.frames
+        return {
+            'frames': frames,
+            'hits': self.hits,
+            'full_updates': self.full_updates,
+            'layer_updates': self.layer_updates,
+            'hit_rate': self.hits / frames if frames else 0.0,
+        }
@@ -0,0 +1,199 @@
+'''
+Headless software renderer.
+
+Draws a cube state the way Game.on_draw does (same projection, back to
+front depth order, front faces only, black outlines) into a NumPy image
+and writes it as PNG without a window, arcade or PIL.
+
+    python raster.py session.cube -o image.png [--size 600]
+    python raster.py --batch out_dir a.cube b.cube ... [--workers N]
+'''
+
+import argparse
+import os
+import struct
+import zlib
+from multiprocessing import Pool
+
+import numpy as np
+
+import projection
+from archive import read_session
+
+# the arcade colors of sidecolors, plus the outline color
+side_rgb = np.array([(0, 0, 255), (255, 165, 0), (0, 255, 0), (255, 0, 0),
+                     (255, 255, 255), (255, 255, 0)], dtype=np.uint8)
+outline_rgb = np.array((0, 0, 0), dtype=np.uint8)
+background_rgb = np.array((210, 210, 220), dtype=np.uint8)
+
+# Game shows the cube at scale 17 in a 600 pixel window
+window_size = 600
+window_scale = 17
+
+_geometry = {3: projection.face_geometry()}
+
+
+def _geometry_for(sticker_count):
+    n = int(round((sticker_count / 6) ** 0.5))
+    if 6 * n * n != sticker_count:
+        raise ValueError('%d stickers do not make a cube' % sticker_count)
+    if n not in _geometry:
+        _geometry[n] = projection.face_geometry(n=n)
+    return _geometry[n]
+
+
+def _fill_quad(image, quad):
+    ''' fill the pixels whose centers are inside a convex quad '''
+    height, width = image.shape[:2]
+    x0 = max(int(np.floor(quad[:, 0].min())), 0)
+    x1 = min(int(np.ceil(quad[:, 0].max())), width)
+    y0 = max(int(np.floor(quad[:, 1].min())), 0)
+    y1 = min(int(np.ceil(quad[:, 1].max())), height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    px = np.arange(x0, x1) + 0.5
+    py = np.arange(y0, y1)[:, None] + 0.5
+    pos = np.ones((y1 - y0, x1 - x0), dtype=bool)
+    neg = np.ones_like(pos)
+    for i in range(4):
+        ax, ay = quad[i - 1]
+        bx, by = quad[i]
+        cross = (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+        pos &= cross >= 0
+        neg &= cross <= 0
+    return (slice(y0, y1), slice(x0, x1)), pos | neg
+
+
+def _outline_quad(image, quad, color):
+    height, width = image.shape[:2]
+    for i in range(4):
+        a = quad[i - 1]
+        b = quad[i]
+        steps = int(np.abs(b - a).max()) + 2
+        t = np.linspace(0, 1, steps)[:, None]
+        p = np.floor(a + (b - a) * t).astype(np.int64)
+        ok = (p[:, 0] >= 0) & (p[:, 0] < width) & (p[:, 1] >= 0) & (
+            p[:, 1] < height)
+        image[p[ok, 1], p[ok, 0]] = color
+
+
+def render(stickers, rotation_x=-20, rotation_y=210, scale=None, size=600):
+    '''
+    Render 54 stickers (or the 6 n n of any n x n cube) to a (size, size, 3)
+    uint8 RGB image, top row first. scale defaults to the Game window
+    scale, adjusted to the image size.
+    '''
+    if scale is None:
+        scale = window_scale * size / window_size
+    points = projection.transform(_geometry_for(len(stickers)), rotation_x,
+                                  rotation_y)
+    quads, depth, facing = projection.project(points, scale, size / 2,
+                                              size / 2)
+    # arcade puts y = 0 at the bottom, images at the top
+    quads[..., 1] = size - quads[..., 1]
+
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[:] = background_rgb
+    for i in projection.draw_order(depth):
+        if not facing[i]:
+            continue
+        filled = _fill_quad(image, quads[i])
+        if filled is not None:
+            area, mask = filled
+            image[area][mask] = side_rgb[stickers[i]]
+        _outline_quad(image, quads[i], outline_rgb)
+    return image
+
+
+def encode_png(image):
+    ''' 8 bit RGB PNG bytes of an (height, width, 3) uint8 image '''
+    height, width = image.shape[:2]
+
+    def chunk(kind, data):
+        body = kind + data
+        return (struct.pack('>I', len(data)) + body +
+                struct.pack('>I', zlib.crc32(body) & 0xffffffff))
+
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0,
+                                       0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) +
+            chunk(b'IEND', b''))
+
+
+def write_png(path, image):
+    with open(path, 'wb') as file:
+        file.write(encode_png(image))
+
+
+def _render_job(job):
+    source, target, view, size = job
+    write_png(target, render(read_session(source), *view, size=size))
+    return target
+
+
+def render_batch(sources, out_dir, size=128, view=(-20, 210, None),
+                 workers=None, chunksize=16):
+    '''
+    Render many .cube files to PNG thumbnails in out_dir across a process
+    pool, keeping their paths below the directory they share (a/x.cube and
+    b/x.cube become a/x.png and b/x.png). Yields the written paths as they
+    finish.
+    '''
+    sources = list(sources)
+    if not sources:
+        return
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(s))
+                               for s in sources])
+    jobs = []
+    targets = {}
+    for source in sources:
+        name = os.path.splitext(os.path.relpath(os.path.abspath(source),
+                                                root))[0] + '.png'
+        target = os.path.join(out_dir, name)
+        if target in targets:
+            raise ValueError('%s and %s would both be rendered to %s' % (
+                targets[target], source, target))
+        targets[target] = source
+        jobs.append((source, target, view, size))
+    for target in targets:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Pool(workers) as pool:
+        for target in pool.imap_unordered(_render_job, jobs, chunksize):
+            yield target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render cube images.')
+    parser.add_argument('cubes', nargs='+', help='.cube files')
+    parser.add_argument('-o', '--output', default='image.png')
+    parser.add_argument('--batch', metavar='DIR',
+                        help='render every file into DIR')
+    parser.add_argument('--size', type=int, default=None)
+    parser.add_argument('--rotation-x', type=float, default=-20)
+    parser.add_argument('--rotation-y', type=float, default=210)
+    parser.add_argument('--scale', type=float, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    view = (args.rotation_x, args.rotation_y, args.scale)
+    if not args.batch and len(args.cubes) > 1:
+        parser.error('render one file at a time, or use --batch DIR')
+    if args.batch:
+        count = 0
+        try:
+            for _ in render_batch(args.cubes, args.batch, args.size or 128,
+                                  view, args.workers):
+                count += 1
+        except ValueError as e:
+            parser.error(str(e))
+        print('rendered', count, 'images into', args.batch)
+    else:
+        write_png(args.output, render(read_session(args.cubes[0]), *view,
+                                      size=args.size or window_size))
+
+
+if __name__ == "__main__":
+    main()
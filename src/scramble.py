@@ -0,0 +1,111 @@
+'''
+Uniformly random cube states.
+
+A state is drawn at the cubie level: random corner and edge permutations,
+random twists and flips, then the parities fixed up so the result is
+reachable by face turns. Every reachable state is equally likely, which
+random face turns never quite achieve.
+
+NumPy is only imported by random_states, so generating a few states stays
+quick to start.
+'''
+
+import random
+
+from cubie import (CubieCube, corner_colors, corner_facelets, edge_colors,
+                   edge_facelets, permutation_parity)
+from cube import SOLVED
+
+
+def random_cubie(rng=random):
+    cp = list(range(8))
+    ep = list(range(12))
+    rng.shuffle(cp)
+    rng.shuffle(ep)
+    if permutation_parity(cp) != permutation_parity(ep):
+        ep[0], ep[1] = ep[1], ep[0]
+    co = [rng.randrange(3) for _ in range(7)]
+    co.append(-sum(co) % 3)
+    eo = [rng.randrange(2) for _ in range(11)]
+    eo.append(sum(eo) % 2)
+    return CubieCube(cp, co, ep, eo)
+
+
+def random_stickers(seed=None):
+    ''' 54 sticker bytes of a uniformly random state '''
+    rng = random if seed is None else random.Random(seed)
+    return random_cubie(rng).to_stickers()
+
+
+def random_config(seed=None):
+    ''' a random state as the six digit strings set_cube takes '''
+    s = random_stickers(seed)
+    return [''.join(str(c) for c in s[i:i + 9]) for i in range(0, 54, 9)]
+
+
+def _parity(perms):
+    import numpy as np
+    n = perms.shape[1]
+    inversions = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n - 1):
+        inversions += (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+    return inversions & 1
+
+
+def _color_table(colors, n):
+    # [slot][piece][orientation] -> colors on the slot's stickers in order;
+    # the same for every slot, the slot axis just makes one gather possible
+    table = [[[colors[j][(m - o) % n] for m in range(n)] for o in range(n)]
+             for j in range(len(colors))]
+    return [table] * len(colors)
+
+
+_tables = None
+
+
+def _bulk_tables():
+    global _tables
+    if _tables is None:
+        import numpy as np
+        _tables = (np.array(_color_table(corner_colors, 3), dtype=np.uint8),
+                   np.array(_color_table(edge_colors, 2), dtype=np.uint8),
+                   np.array(corner_facelets).reshape(-1),
+                   np.array(edge_facelets).reshape(-1))
+    return _tables
+
+
+def random_states(n, seed=None, rng=None):
+    ''' (n, 54) uint8 array of uniformly random states; seed or a NumPy
+    Generator to draw from '''
+    import numpy as np
+    corner_table, edge_table, corner_columns, edge_columns = _bulk_tables()
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    cp = np.argsort(rng.random((n, 8)), axis=1)
+    ep = np.argsort(rng.random((n, 12)), axis=1)
+    swap = _parity(cp) != _parity(ep)
+    ep[swap, 0], ep[swap, 1] = ep[swap, 1], ep[swap, 0]
+
+    co = rng.integers(0, 3, (n, 8))
+    co[:, 7] = -co[:, :7].sum(axis=1) % 3
+    eo = rng.integers(0, 2, (n, 12))
+    eo[:, 11] = eo[:, :11].sum(axis=1) % 2
+
+    out = np.tile(np.frombuffer(SOLVED, dtype=np.uint8), (n, 1))
+    out[:, corner_columns] = corner_table[np.arange(8), cp, co].reshape(n, 24)
+    out[:, edge_columns] = edge_table[np.arange(12), ep, eo].reshape(n, 24)
+    return out
+
+
+def state_blocks(count, seed=None, block=4096):
+    '''
+    count random states as (<= block, 54) arrays from one seeded stream.
+    Blocks are always drawn whole, so the same seed gives the same first
+    states whatever count is.
+    '''
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    while count > 0:
+        states = random_states(block, rng=rng)
+        yield states[:count]
+        count -= block
@@ -0,0 +1,499 @@
+'''
+Local solve server: a small HTTP/1.1 service on localhost or a Unix
+socket, built on asyncio alone.
+
+    python server.py serve [--port 8642 | --unix PATH] [--workers N]
+    python server.py client [--port 8642 | --unix PATH] [--kind classify]
+                            [--requests 10000] [--concurrency 32]
+
+    POST /solve      state in, {"moves": [...], "length": n}
+    POST /classify   state in, {"stage": "..."}  (Game.derive_state)
+    POST /render     state in, image/png thumbnail (?size=128)
+    GET  /stats      request counts, queue depths and latency histograms
+
+A state is the set_cube configuration: six 9 digit strings, sent as plain
+text or as JSON {"state": [...]} (a single 54 digit string works too).
+
+Requests of a kind wait in a bounded queue. A batcher per kind takes
+whatever has piled up (up to --max-batch) and handles it in one call:
+classify_many in the event loop, or one job on a pool of worker processes
+started up front for solving and rendering. Every worker memory maps the
+one solver table file, so the tables are shared through the page cache.
+A full queue answers 503 straight away instead of growing without bound.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+import classify
+import solvecache
+import solver
+from cube import CubeState, move_name
+
+DEFAULT_PORT = 8642
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_MAX_BATCH = 64
+
+_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            413: 'Payload Too Large', 500: 'Internal Server Error',
+            503: 'Service Unavailable'}
+_routes = ('solve', 'classify', 'render', 'stats')
+
+
+def parse_state(body):
+    ''' 54 sticker bytes of a request body, ValueError if malformed '''
+    text = body.decode().strip()
+    if text.startswith('{'):
+        request = json.loads(text)
+        state = request.get('state') if isinstance(request, dict) else None
+        if isinstance(state, str):
+            text = state
+        elif isinstance(state, list) and all(
+                isinstance(c, str) for c in state):
+            text = ' '.join(state)
+        elif isinstance(state, list) and all(
+                type(c) is int and 0 <= c <= 9 for c in state):
+            text = ''.join(map(str, state))
+        else:
+            raise ValueError('"state" is a digit string, a list of them '
+                             'or a list of 54 colors')
+    digits = ''.join(text.split())
+    if len(digits) != 54:
+        raise ValueError('a state has 54 digits, got %d' % len(digits))
+    if digits.strip('012345'):
+        raise ValueError('sticker colors are 0 .. 5')
+    return CubeState.from_config(
+        [digits[i:i + 9] for i in range(0, 54, 9)]).stickers
+
+
+class Histogram:
+    ''' latencies in power of two microsecond buckets '''
+
+    def __init__(self):
+        self.buckets = [0] * 40
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        us = int(seconds * 1e6)
+        self.buckets[min(us.bit_length(), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q):
+        ''' upper bound of the bucket holding the q percentile, in ms '''
+        rank = q / 100 * self.count
+        seen = 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return (1 << b) / 1000
+        return 0.0
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            # bucket upper bound in microseconds -> count
+            'buckets': {str(1 << b): n for b, n in enumerate(self.buckets)
+                        if n},
+        }
+
+
+# worker process side
+
+_solver = None
+_cache = None
+
+
+def _init_worker(table_path, cache_path=None, improve_seconds=0.0):
+    global _solver, _cache
+    _solver = solver.Solver(solver.load_tables(table_path),
+                            improve_seconds=improve_seconds)
+    if cache_path:
+        _cache = solvecache.SolutionCache(cache_path)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _solve_batch(states):
+    results = []
+    for stickers in states:
+        try:
+            if _cache is None:
+                moves = _solver.solve_stickers(stickers)
+            else:
+                moves = _cache.solve(_solver, stickers)
+        except ValueError as e:
+            results.append({'error': str(e)})
+            continue
+        results.append({'moves': [move_name(m) for m in moves],
+                         'length': len(moves)})
+    return results
+
+
+def _render_batch(jobs):
+    import raster
+    return [raster.encode_png(raster.render(stickers, size=size))
+            for stickers, size in jobs]
+
+
+def _classify_batch(states):
+    if len(states) < 16:
+        return [classify.stage_name(s) for s in states]
+    import numpy as np
+    rows = np.frombuffer(b''.join(states), dtype=np.uint8).reshape(-1, 54)
+    return [classify.stage_names[c] for c in classify.classify_many(rows)]
+
+
+class Batcher:
+    ''' A bounded queue of one request kind, drained in batches. '''
+
+    def __init__(self, handle, max_queue, max_batch, in_flight=1):
+        self.handle = handle
+        self.queue = asyncio.Queue(max_queue)
+        self.max_batch = max_batch
+        # batches handled at the same time, e.g. one per worker
+        self.slots = asyncio.Semaphore(in_flight)
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        ''' future of the item's result; raises asyncio.QueueFull '''
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        return future
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            await self.slots.acquire()
+            # whatever arrived while waiting for a slot joins the batch
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.batches += 1
+            self.items += len(batch)
+            asyncio.ensure_future(self._finish(batch))
+
+    async def _finish(self, batch):
+        try:
+            results = await self.handle([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class SolveServer:
+
+    def __init__(self, workers=None, max_queue=DEFAULT_MAX_QUEUE,
+                 max_batch=DEFAULT_MAX_BATCH,
+                 table_path=solver.default_table_path, cache_path=None,
+                 improve_seconds=0.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.table_path = table_path
+        self.cache_path = cache_path
+        self.improve_seconds = improve_seconds
+        self.histograms = {}
+        self.rejected = 0
+        self.restarts = 0
+        self.started = time.time()
+
+    async def start(self):
+        # tables are built (once) before any worker maps them
+        solver.get_tables(self.table_path)
+        loop = asyncio.get_running_loop()
+        await self.start_pool()
+
+        async def in_pool(func, items):
+            pool = self.pool
+            try:
+                return await loop.run_in_executor(pool, func, items)
+            except BrokenProcessPool:
+                # a worker died: this batch fails, later ones get a new
+                # pool (once, however many batches saw the same crash)
+                if self.pool is pool:
+                    self.restarts += 1
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    await self.start_pool()
+                raise
+
+        async def classify_items(items):
+            return _classify_batch(items)
+
+        # a batch per worker in flight, so no worker idles while a slow
+        # batch finishes
+        self.batchers = {
+            'solve': Batcher(lambda items: in_pool(_solve_batch, items),
+                             self.max_queue, self.max_batch, self.workers),
+            'render': Batcher(lambda items: in_pool(_render_batch, items),
+                              self.max_queue, self.max_batch, self.workers),
+            'classify': Batcher(classify_items, self.max_queue,
+                                self.max_batch * 16),
+        }
+        self.tasks = [asyncio.ensure_future(b.run())
+                      for b in self.batchers.values()]
+
+    async def start_pool(self):
+        self.pool = ProcessPoolExecutor(self.workers,
+                                        initializer=_init_worker,
+                                        initargs=(self.table_path,
+                                                  self.cache_path,
+                                                  self.improve_seconds))
+        loop = asyncio.get_running_loop()
+        # fork every worker now rather than on the first request
+        await asyncio.gather(*[loop.run_in_executor(self.pool, _ready)
+                               for _ in range(self.workers)])
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'uptime_s': time.time() - self.started,
+            'workers': self.workers,
+            'rejected': self.rejected,
+            'pool_restarts': self.restarts,
+            'queues': {kind: {'waiting': b.queue.qsize(),
+                              'batches': b.batches,
+                              'mean_batch': b.items / b.batches
+                              if b.batches else 0}
+                       for kind, b in self.batchers.items()},
+            'latency': {path: h.snapshot()
+                        for path, h in self.histograms.items()},
+        }
+
+    async def respond(self, method, target, body):
+        ''' (status, content type, body bytes) of one request '''
+        try:
+            return await self._respond(method, target, body)
+        except BrokenProcessPool:
+            return 500, 'text/plain', b'worker crashed\n'
+        except Exception as e:
+            return 500, 'text/plain', ('%s: %s\n' % (
+                type(e).__name__, e)).encode()
+
+    async def _respond(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path
+        if method == 'GET' and path == '/stats':
+            return 200, 'application/json', json.dumps(self.stats()).encode()
+        kind = path.strip('/')
+        if method != 'POST' or kind not in self.batchers:
+            return 404, 'text/plain', b'not found\n'
+        try:
+            stickers = parse_state(body)
+            item = stickers
+            if kind == 'render':
+                size = int(parse_qs(url.query).get('size', ['128'])[0])
+                if not 16 <= size <= 1024:
+                    raise ValueError('size must be 16 .. 1024')
+                item = (stickers, size)
+        except ValueError as e:
+            return 400, 'text/plain', (str(e) + '\n').encode()
+        try:
+            future = self.batchers[kind].submit(item)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503, 'text/plain', b'busy, retry later\n'
+        result = await future
+        if kind == 'render':
+            return 200, 'image/png', result
+        if kind == 'classify':
+            result = {'stage': result}
+        status = 400 if 'error' in result else 200
+        return status, 'application/json', json.dumps(result).encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        k, v = line.split(':', 1)
+                        headers[k.strip().lower()] = v.strip()
+                length = int(headers.get('content-length', 0))
+                if length > 1 << 16:
+                    status, kind, body = 413, 'text/plain', b'too large\n'
+                    keep = False
+                else:
+                    body = await reader.readexactly(length)
+                    began = time.perf_counter()
+                    status, kind, body = await self.respond(method, target,
+                                                            body)
+                    # known routes only, so clients cannot add keys
+                    route = urlsplit(target).path.strip('/')
+                    if route not in _routes:
+                        route = 'other'
+                    hist = self.histograms.get(route)
+                    if hist is None:
+                        hist = self.histograms[route] = Histogram()
+                    hist.record(time.perf_counter() - began)
+                    keep = headers.get('connection', '').lower() != 'close'
+                extra = '' if status != 503 else 'Retry-After: 1\r\n'
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: %s\r\n'
+                              'Content-Length: %d\r\n%s\r\n' % (
+                                  status, _reasons[status], kind, len(body),
+                                  extra)).encode() + body)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, unix=None, **options):
+    app = SolveServer(**options)
+    await app.start()
+    if unix:
+        server = await asyncio.start_unix_server(app.handle, unix)
+        where = unix
+    else:
+        server = await asyncio.start_server(app.handle, host, port)
+        where = '%s:%d' % (host, port)
+    print('serving on', where, 'with', app.workers, 'workers')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+# test client
+
+async def _client_worker(connect, kind, bodies, latencies, counts):
+    reader, writer = await connect()
+    request = ('POST /%s HTTP/1.1\r\nHost: localhost\r\n'
+               'Content-Type: text/plain\r\nContent-Length: %%d\r\n\r\n' %
+               kind)
+    try:
+        for body in bodies:
+            began = time.perf_counter()
+            writer.write((request % len(body)).encode() + body)
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - began)
+            counts[status] = counts.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_client(kind='classify', requests=10000, concurrency=32,
+                     host='127.0.0.1', port=DEFAULT_PORT, unix=None,
+                     seed=1):
+    ''' drive the server with random states, returns a summary dict '''
+    import scramble
+    if unix:
+        def connect():
+            return asyncio.open_unix_connection(unix)
+    else:
+        def connect():
+            return asyncio.open_connection(host, port)
+    states = scramble.random_states(min(requests, 1000), seed)
+    pool = [''.join(map(str, s)).encode() for s in states.tolist()]
+    bodies = [pool[i % len(pool)] for i in range(requests)]
+    latencies = []
+    counts = {}
+    began = time.perf_counter()
+    await asyncio.gather(*[
+        _client_worker(connect, kind, bodies[i::concurrency], latencies,
+                       counts)
+        for i in range(concurrency)])
+    elapsed = time.perf_counter() - began
+    latencies.sort()
+
+    def pick(q):
+        return latencies[min(len(latencies) - 1,
+                             int(q / 100 * len(latencies)))] * 1000
+    return {
+        'kind': kind,
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'per_second': len(latencies) / elapsed,
+        'status': counts,
+        'p50_ms': pick(50),
+        'p99_ms': pick(99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local cube service.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'client'):
+        p = commands.add_parser(name)
+        p.add_argument('--host', default='127.0.0.1')
+        p.add_argument('--port', type=int, default=DEFAULT_PORT)
+        p.add_argument('--unix', metavar='PATH',
+                       help='listen on / connect to a Unix socket')
+    p = commands.choices['serve']
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    p.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    p.add_argument('--tables', default=solver.default_table_path)
+    p.add_argument('--cache', nargs='?', const=solvecache.default_cache_path,
+                   metavar='PATH', help='share a solution cache between the '
+                   'workers (default %(const)s)')
+    p.add_argument('--improve', type=float, default=0.0,
+                   metavar='SECONDS', help='look for shorter solutions this '
+                   'long after the first one (default 0)')
+    p = commands.choices['client']
+    p.add_argument('--kind', default='classify',
+                   choices=['classify', 'solve', 'render'])
+    p.add_argument('--requests', type=int, default=10000)
+    p.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix,
+                              workers=args.workers,
+                              max_queue=args.max_queue,
+                              max_batch=args.max_batch,
+                              table_path=args.tables,
+                              cache_path=args.cache,
+                              improve_seconds=args.improve))
+        except KeyboardInterrupt:
+            pass
+    else:
+        summary = asyncio.run(run_client(args.kind, args.requests,
+                                         args.concurrency, args.host,
+                                         args.port, args.unix))
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
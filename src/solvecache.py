@@ -0,0 +1,188 @@
+'''
+A persistent cache of solutions, shared by symmetric states.
+
+States are keyed by their canonical form under the 48 symmetries
+(symmetry.py), packed to 21 bytes (packed.py), so one stored solution
+serves all up to 48 positions symmetric to it. The solution is kept for
+the canonical state and conjugated back into the orientation asked for.
+
+Two tiers: a bounded LRU dict in memory in front of an sqlite file on
+disk. The memory tier is keyed by the exact state, so a repeated lookup
+skips canonical() too; symmetric states meet on disk. The file is opened
+in WAL mode, where every write is its own transaction, so any number of
+processes (batchsolve and server workers) can share it; each process
+keeps its own memory tier and connection. Entries expire
+after max_age seconds and the file is pruned to max_rows, least recently
+used first.
+'''
+
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import packed
+import symmetry
+
+default_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'solutions.sqlite')
+DEFAULT_MEMORY = 65536
+DEFAULT_ROWS = 1000000
+DEFAULT_AGE = 30 * 24 * 3600
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS solutions (
+    key BLOB PRIMARY KEY,
+    moves BLOB NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used);
+'''
+
+
+def state_key(stickers):
+    ''' (key, g): the cache key of a state and the symmetry taking the state
+    to its canonical form '''
+    best, g = symmetry.canonical(stickers)
+    return packed.pack(best).to_bytes(21, 'little'), g
+
+
+class SolutionCache:
+
+    def __init__(self, path=default_cache_path, memory=DEFAULT_MEMORY,
+                 max_rows=DEFAULT_ROWS, max_age=DEFAULT_AGE):
+        self.path = path
+        self.memory = memory
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.entries = OrderedDict()    # state -> (moves bytes, created)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        # a connection must not cross a fork, reopen in a new process
+        if self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(_schema)
+            self._db = db
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self):
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = None
+        self._pid = None
+
+    def _remember(self, state, moves, created):
+        self.entries[state] = (moves, created)
+        self.entries.move_to_end(state)
+        while len(self.entries) > self.memory:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key, now):
+        ''' stored moves of a canonical key, or None '''
+        db = self.db
+        row = db.execute('SELECT moves, created FROM solutions WHERE key = ?',
+                         (key,)).fetchone()
+        if row is None:
+            return None
+        moves, created = row
+        if now - created > self.max_age:
+            db.execute('DELETE FROM solutions WHERE key = ?', (key,))
+            self.evictions += 1
+            return None
+        db.execute('UPDATE solutions SET used = ? WHERE key = ?', (now, key))
+        return moves, created
+
+    def get(self, stickers):
+        ''' cached solution of 54 stickers as move indices, or None '''
+        state = bytes(stickers)
+        now = time.time()
+        entry = self.entries.get(state)
+        if entry is not None:
+            if now - entry[1] <= self.max_age:
+                self.entries.move_to_end(state)
+                self.hits += 1
+                return list(entry[0])
+            del self.entries[state]
+            self.evictions += 1
+        key, g = state_key(state)
+        row = self._load(key, now)
+        if row is None:
+            self.misses += 1
+            return None
+        moves = symmetry.conjugate_moves(row[0], symmetry.inverse[g])
+        self._remember(state, bytes(moves), row[1])
+        self.disk_hits += 1
+        return moves
+
+    def put(self, stickers, moves):
+        ''' remember that moves solve stickers '''
+        state = bytes(stickers)
+        key, g = state_key(state)
+        stored = bytes(symmetry.conjugate_moves(moves, g))
+        now = time.time()
+        self.db.execute('INSERT OR REPLACE INTO solutions '
+                        'VALUES (?, ?, ?, ?)', (key, stored, now, now))
+        self._remember(state, bytes(moves), now)
+        self.writes += 1
+        # prune now and then rather than on every write
+        if self.writes % 1024 == 0:
+            self.prune()
+
+    def solve(self, solver, stickers, max_length=None):
+        ''' cached solution, or solve with solver and cache the result '''
+        moves = self.get(stickers)
+        if moves is not None and (max_length is None or
+                                  len(moves) <= max_length):
+            return moves
+        if max_length is None:
+            moves = solver.solve_stickers(stickers)
+        else:
+            moves = solver.solve_stickers(stickers, max_length)
+        self.put(stickers, moves)
+        return moves
+
+    def prune(self):
+        ''' drop expired rows and the least recently used beyond max_rows,
+        returns how many went '''
+        db = self.db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            gone = db.execute('DELETE FROM solutions WHERE created < ?',
+                              (time.time() - self.max_age,)).rowcount
+            excess = db.execute('SELECT count(*) FROM solutions'
+                                ).fetchone()[0] - self.max_rows
+            if excess > 0:
+                gone += db.execute(
+                    'DELETE FROM solutions WHERE key IN (SELECT key FROM '
+                    'solutions ORDER BY used LIMIT ?)', (excess,)).rowcount
+        self.evictions += gone
+        return gone
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM solutions').fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups
+            if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self.entries),
+        }
@@ -0,0 +1,473 @@
+'''
+Two-phase (Kociemba style) solver.
+
+Phase 1 brings the cube into the group <U, D, R2, L2, F2, B2> (WHITE and
+YELLOW turns plus half turns of the other sides) by fixing corner twist,
+edge flip and the middle slice edges. Phase 2 then solves the cube using
+only those moves.
+
+The first solution found is returned as is unless the Solver is given
+improve_seconds: then the search goes on with the length bound one below
+the best so far until it proves no shorter two phase solution exists or
+the time runs out. Results are short but not guaranteed optimal, and with
+improve_seconds they depend on how fast the machine is.
+
+The move and pruning tables are built once with NumPy, written to a single
+cache file and memory mapped on later runs. Solver() and solve() build
+them on the spot (blocking, once) when the file is missing; try_solver()
+starts a background build instead and returns None until it is done.
+'''
+
+import json
+import os
+import time
+import zlib
+from itertools import combinations, permutations
+
+import numpy as np
+
+from cube import MOVES, NUM_MOVES, CubeState, move_name
+from cubie import CubieCube, move_cubes
+
+TABLE_VERSION = 1
+TABLE_MAGIC = b'RUBIKTBL'
+default_table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'solver.tables')
+
+N_TWIST = 2187
+N_FLIP = 2048
+N_SLICE = 495
+N_PERM8 = 40320
+N_PERM4 = 24
+
+# moves allowed in phase 2: half turns of the side rings, anything on
+# WHITE / YELLOW
+PHASE2_MOVES = [1, 4, 7, 10, 12, 13, 14, 15, 16, 17]
+
+
+# long enough to keep a random scramble well under 50 ms
+DEFAULT_MAX_LENGTH = 22
+# time spent looking for shorter solutions after the first one, off by
+# default so solving stays fast and reproducible
+IMPROVE_SECONDS = 0.0
+
+# opposite sides commute, the search only tries them in one order
+_axis = [0, 1, 0, 1, 2, 2]
+
+_fact = [1, 1, 2, 6, 24, 120, 720, 5040, 40320]
+
+_slice_masks = [sum(1 << p for p in c) for c in combinations(range(12), 4)]
+SLICE_SOLVED = _slice_masks.index(0xf00)
+
+
+def perm_rank(p):
+    rank = 0
+    n = len(p)
+    for i in range(n - 1):
+        smaller = 0
+        for j in range(i + 1, n):
+            if p[j] < p[i]:
+                smaller += 1
+        rank += smaller * _fact[n - 1 - i]
+    return rank
+
+
+def _perm_ranks(perms):
+    n = perms.shape[1]
+    rank = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n - 1):
+        smaller = (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+        rank += smaller * _fact[n - 1 - i]
+    return rank
+
+
+def twist_coord(cc):
+    t = 0
+    for o in cc.co[:7]:
+        t = t * 3 + o
+    return t
+
+
+def flip_coord(cc):
+    f = 0
+    for o in cc.eo[:11]:
+        f = f * 2 + o
+    return f
+
+
+def slice_coord(cc):
+    mask = 0
+    for i, e in enumerate(cc.ep):
+        if e >= 8:
+            mask |= 1 << i
+    return _slice_lookup[mask]
+
+
+_slice_lookup = [0] * 4096
+for _i, _m in enumerate(_slice_masks):
+    _slice_lookup[_m] = _i
+
+
+def _digits(n, base, count):
+    values = np.arange(n)
+    out = np.zeros((n, count), dtype=np.int64)
+    for i in range(count - 1, -1, -1):
+        out[:, i] = values % base
+        values //= base
+    return out
+
+
+def _orientation_table(base, count):
+    n = base ** (count - 1)
+    ori = _digits(n, base, count - 1)
+    ori = np.hstack([ori, (-ori.sum(axis=1) % base)[:, None]])
+    weights = base ** np.arange(count - 2, -1, -1)
+    table = np.zeros((n, NUM_MOVES), dtype=np.uint16)
+    for m, mc in enumerate(move_cubes):
+        perm, twist = (mc.cp, mc.co) if count == 8 else (mc.ep, mc.eo)
+        new = (ori[:, perm] + twist) % base
+        table[:, m] = new[:, :-1] @ weights
+    return table
+
+
+def _slice_table():
+    occupied = np.array([[(mask >> i) & 1 for i in range(12)]
+                         for mask in _slice_masks], dtype=np.int64)
+    lookup = np.array(_slice_lookup)
+    table = np.zeros((N_SLICE, NUM_MOVES), dtype=np.uint16)
+    for m, mc in enumerate(move_cubes):
+        new = occupied[:, mc.ep]
+        table[:, m] = lookup[new @ (1 << np.arange(12))]
+    return table
+
+
+def _permutation_table(n, slot_perms):
+    perms = np.array(list(permutations(range(n))), dtype=np.int64)
+    table = np.zeros((len(perms), len(slot_perms)), dtype=np.uint16)
+    for m, p in enumerate(slot_perms):
+        table[:, m] = _perm_ranks(perms[:, p])
+    return table
+
+
+def prune_table(move_a, move_b, start=0):
+    '''
+    Breadth first distances over the product of two coordinates, index
+    a * len(move_b) + b.
+    '''
+    nb = len(move_b)
+    dist = np.full(len(move_a) * nb, -1, dtype=np.int8)
+    dist[start] = 0
+    depth = 0
+    while True:
+        frontier = np.flatnonzero(dist == depth)
+        if not len(frontier):
+            return dist
+        a = frontier // nb
+        b = frontier % nb
+        for m in range(move_a.shape[1]):
+            nxt = move_a[a, m].astype(np.int64) * nb + move_b[b, m]
+            dist[nxt[dist[nxt] < 0]] = depth + 1
+        depth += 1
+
+
+# pruning table: (name, first move table, second move table, solved index)
+PRUNE_SPECS = [
+    ('twist_prune', 'twist_move', 'slice_move', SLICE_SOLVED),
+    ('flip_prune', 'flip_move', 'slice_move', SLICE_SOLVED),
+    ('corner_prune', 'corner_move', 'sliceperm_move', 0),
+    ('edge_prune', 'edge_move', 'sliceperm_move', 0),
+]
+
+
+def build_move_tables():
+    t = {}
+    t['twist_move'] = _orientation_table(3, 8)
+    t['flip_move'] = _orientation_table(2, 12)
+    t['slice_move'] = _slice_table()
+    t['corner_move'] = _permutation_table(
+        8, [move_cubes[m].cp for m in PHASE2_MOVES])
+    t['edge_move'] = _permutation_table(
+        8, [move_cubes[m].ep[:8] for m in PHASE2_MOVES])
+    t['sliceperm_move'] = _permutation_table(
+        4, [[e - 8 for e in move_cubes[m].ep[8:]] for m in PHASE2_MOVES])
+    return t
+
+
+def build_tables():
+    ''' all move and pruning tables as a dict of arrays '''
+    t = build_move_tables()
+    for name, a, b, start in PRUNE_SPECS:
+        t[name] = prune_table(t[a], t[b], start)
+    return t
+
+
+def table_key():
+    ''' changes whenever the move definitions the tables depend on change '''
+    return '%d:%08x' % (TABLE_VERSION,
+                        zlib.crc32(bytes(i for p in MOVES for i in p)))
+
+
+def save_tables(tables, path=default_table_path):
+    '''
+    Write tables into one file: magic, header length, JSON header and the
+    raw arrays, each 8 byte aligned so they can be mapped in place.
+    '''
+    index = {}
+    offset = 0
+    for name, a in tables.items():
+        index[name] = [a.dtype.str, list(a.shape), offset]
+        offset += (a.nbytes + 7) & ~7
+    header = json.dumps({'key': table_key(), 'arrays': index}).encode()
+    header += b' ' * (-(len(TABLE_MAGIC) + 8 + len(header)) % 8)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(TABLE_MAGIC)
+        file.write(len(header).to_bytes(8, 'little'))
+        file.write(header)
+        for name, a in tables.items():
+            data = np.ascontiguousarray(a).tobytes()
+            file.write(data)
+            file.write(b'\0' * (-len(data) % 8))
+    os.replace(tmp, path)
+
+
+def load_tables(path=default_table_path):
+    ''' memory map a table file, None if it is missing or stale '''
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(TABLE_MAGIC)) != TABLE_MAGIC:
+                return None
+            size = int.from_bytes(file.read(8), 'little')
+            header = json.loads(file.read(size))
+    except (OSError, ValueError):
+        return None
+    if header.get('key') != table_key():
+        return None
+
+    start = len(TABLE_MAGIC) + 8 + size
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+    tables = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) * dtype.itemsize
+        a = raw[start + offset:start + offset + count]
+        tables[name] = a.view(dtype).reshape(shape)
+    return tables
+
+
+def get_tables(path=default_table_path, wait=True):
+    '''
+    Load the tables, building them first if needed. With wait=False a
+    missing file starts a background build instead and None is returned.
+    '''
+    tables = load_tables(path)
+    if tables is None:
+        if not wait:
+            import tablegen
+            tablegen.start_background(path)
+            return None
+        save_tables(build_tables(), path)
+        tables = load_tables(path)
+    return tables
+
+
+class _OutOfTime(Exception):
+    ''' ends the search for shorter solutions '''
+
+
+class Solver:
+    '''
+    Two-phase solver over a set of loaded tables. Without tables it loads
+    them from path, building the file first if it is missing (blocking).
+    '''
+
+    def __init__(self, tables=None, path=default_table_path,
+                 improve_seconds=IMPROVE_SECONDS):
+        self.improve_seconds = improve_seconds
+        if tables is None:
+            tables = get_tables(path)
+        self.tables = tables
+        # flat memoryviews give plain int lookups without copying the map
+        view = {name: memoryview(np.ascontiguousarray(a).reshape(-1))
+                for name, a in tables.items()}
+        self.twist_move = view['twist_move']
+        self.flip_move = view['flip_move']
+        self.slice_move = view['slice_move']
+        self.twist_prune = view['twist_prune']
+        self.flip_prune = view['flip_prune']
+        self.corner_prune = view['corner_prune']
+        self.edge_prune = view['edge_prune']
+
+    def solve(self, configuration, max_length=DEFAULT_MAX_LENGTH):
+        ''' solve a set_cube style configuration, returns move names '''
+        cube = CubeState.from_config(configuration)
+        return [move_name(m) for m in self.solve_stickers(cube.stickers,
+                                                         max_length)]
+
+    def solve_stickers(self, stickers, max_length=DEFAULT_MAX_LENGTH):
+        ''' solve 54 stickers, returns move indices '''
+        cc = CubieCube.from_stickers(stickers)
+        if not cc.verify():
+            raise ValueError('cube cannot be solved')
+        return self.solve_cubie(cc, max_length)
+
+    def solve_cubie(self, cc, max_length=DEFAULT_MAX_LENGTH,
+                    improve_seconds=None):
+        '''
+        the first solution, then shorter ones as long as improve_seconds
+        (default self.improve_seconds) allow; returns the shortest found
+        '''
+        if improve_seconds is None:
+            improve_seconds = self.improve_seconds
+        self.start = cc
+        self.max_length = max_length
+        self.moves = []
+        self.best = None
+        self.deadline = None
+        twist = twist_coord(cc)
+        flip = flip_coord(cc)
+        slc = slice_coord(cc)
+        depth = 0
+        try:
+            while depth <= self.max_length:
+                self.moves = []
+                found = self._phase1(twist, flip, slc, depth, -1)
+                if found is None:
+                    depth += 1
+                    continue
+                if self.best is None:
+                    if improve_seconds <= 0:
+                        return found
+                    self.deadline = time.perf_counter() + improve_seconds
+                self.best = found
+                # the same phase 1 depth again, now for something shorter
+                self.max_length = len(found) - 1
+        except _OutOfTime:
+            pass
+        if self.best is None:
+            raise ValueError('no solution within %d moves' % max_length)
+        return self.best
+
+    def _phase1(self, twist, flip, slc, togo, last):
+        if togo == 0:
+            if twist or flip or slc != SLICE_SOLVED:
+                return None
+            if self.moves and self.moves[-1] in PHASE2_MOVES:
+                # a shorter phase 1 ending here was already tried
+                return None
+            return self._start_phase2()
+
+        moves = self.moves
+        twist_move = self.twist_move
+        flip_move = self.flip_move
+        slice_move = self.slice_move
+        twist_prune = self.twist_prune
+        flip_prune = self.flip_prune
+        for m in range(NUM_MOVES):
+            side = m // 3
+            if last >= 0 and (side == last or (
+                    _axis[side] == _axis[last] and side < last)):
+                continue
+            t = twist_move[twist * NUM_MOVES + m]
+            s = slice_move[slc * NUM_MOVES + m]
+            if twist_prune[t * N_SLICE + s] >= togo:
+                continue
+            f = flip_move[flip * NUM_MOVES + m]
+            if flip_prune[f * N_SLICE + s] >= togo:
+                continue
+            moves.append(m)
+            found = self._phase1(t, f, s, togo - 1, side)
+            if found is not None:
+                return found
+            moves.pop()
+        return None
+
+    def _start_phase2(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise _OutOfTime()
+        cc = self.start
+        for m in self.moves:
+            cc = cc.multiply(move_cubes[m])
+        corner = perm_rank(cc.cp)
+        edge = perm_rank(cc.ep[:8])
+        sliceperm = perm_rank([e - 8 for e in cc.ep[8:]])
+        togo = self.max_length - len(self.moves)
+        h = max(self.corner_prune[corner * N_PERM4 + sliceperm],
+                self.edge_prune[edge * N_PERM4 + sliceperm])
+        last = self.moves[-1] // 3 if self.moves else -1
+        for depth in range(h, togo + 1):
+            found = self._phase2(corner, edge, sliceperm, last, depth)
+            if found is not None:
+                return self.moves + found
+        return None
+
+    def _phase2(self, corner, edge, sliceperm, last, depth):
+        '''
+        Phase 2 searched one layer at a time over NumPy arrays. Every layer
+        keeps the distinct states that can still finish within depth moves.
+        '''
+        t = self.tables
+        c = np.array([corner])
+        e = np.array([edge])
+        p = np.array([sliceperm])
+        s = np.array([last])
+        trail = []
+        for togo in range(depth, 0, -1):
+            nc = t['corner_move'][c].astype(np.int64)
+            np_ = t['sliceperm_move'][p]
+            ok = _phase2_allowed[s] & (
+                t['corner_prune'][nc * N_PERM4 + np_] < togo)
+            rows, cols = np.nonzero(ok)
+            nc = nc[rows, cols]
+            np_ = np_[rows, cols]
+            ne = t['edge_move'][e[rows], cols].astype(np.int64)
+            keep = t['edge_prune'][ne * N_PERM4 + np_] < togo
+            rows, cols, nc, ne, np_ = (rows[keep], cols[keep], nc[keep],
+                                       ne[keep], np_[keep])
+            if not len(rows):
+                return None
+            key = (nc * N_PERM8 + ne) * N_PERM4 + np_
+            key, first = np.unique(key, return_index=True)
+            rows = rows[first]
+            cols = cols[first]
+            trail.append((rows, cols))
+            c, e, p = nc[first], ne[first], np_[first]
+            s = _phase2_side[cols]
+
+        # only the solved state has a pruning distance of zero
+        moves = []
+        i = 0
+        for rows, cols in reversed(trail):
+            moves.append(PHASE2_MOVES[cols[i]])
+            i = rows[i]
+        return moves[::-1]
+
+
+# _phase2_allowed[last side] masks the phase 2 moves worth trying next,
+# row -1 is used before the first move
+_phase2_side = np.array([m // 3 for m in PHASE2_MOVES])
+_phase2_allowed = np.array(
+    [[not (side == last or (_axis[side] == _axis[last] and side < last))
+      for side in _phase2_side] for last in range(6)] +
+    [[True] * len(PHASE2_MOVES)])
+
+
+def try_solver(path=default_table_path):
+    ''' a Solver if the tables are ready, else None (and they get built) '''
+    tables = get_tables(path, wait=False)
+    return None if tables is None else Solver(tables)
+
+
+_solver = None
+
+
+def solve(configuration, max_length=DEFAULT_MAX_LENGTH):
+    '''
+    solve with a shared solver, loading the tables on first use (building
+    them if missing, which blocks; see try_solver)
+    '''
+    global _solver
+    if _solver is None:
+        _solver = Solver()
+    return _solver.solve(configuration, max_length)
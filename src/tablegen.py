@@ -0,0 +1,270 @@
+'''
+Parallel solver table generator.
+
+Every breadth first depth of a pruning table is split into index ranges
+and expanded by a process pool. The distance arrays live in shared memory
+so workers write new distances in place. Progress is reported per depth.
+Every finished table is saved once and the one being built at most every
+CHECKPOINT_INTERVAL seconds, so an interrupted build picks up where it
+stopped; checkpoints of other table versions (solver.table_key) are
+ignored.
+
+    python tablegen.py [--output FILE] [--workers N] [--checkpoint PREFIX]
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+import solver
+
+CHECKPOINT_INTERVAL = 10.0
+# an empty lock older than this was left by a starter that died
+LOCK_GRACE = 5.0
+
+_worker = {}
+
+
+def _init_worker(move_tables, shm_name, size):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['dist'] = np.ndarray(size, dtype=np.int8, buffer=shm.buf)
+    _worker['moves'] = move_tables
+
+
+def _expand(job):
+    name_a, name_b, lo, hi, depth = job
+    dist = _worker['dist']
+    move_a = _worker['moves'][name_a]
+    move_b = _worker['moves'][name_b]
+    nb = len(move_b)
+    frontier = np.flatnonzero(dist[lo:hi] == depth) + lo
+    a = frontier // nb
+    b = frontier % nb
+    for m in range(move_a.shape[1]):
+        nxt = move_a[a, m].astype(np.int64) * nb + move_b[b, m]
+        # several workers may write the same cell, always the same value
+        dist[nxt[dist[nxt] < 0]] = depth + 1
+    return len(frontier)
+
+
+def _save(path, **arrays):
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, key=np.array(solver.table_key()), **arrays)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    ''' arrays of a checkpoint file, None if missing or of other tables '''
+    try:
+        with np.load(path) as data:
+            if str(data['key']) != solver.table_key():
+                return None
+            return {k: data[k] for k in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _done_path(checkpoint, name):
+    return '%s.%s.npz' % (checkpoint, name)
+
+
+def _partial_path(checkpoint):
+    return checkpoint + '.partial.npz'
+
+
+def _load_checkpoint(checkpoint):
+    ''' finished tables by name, and (name, dist, depth) or None '''
+    done = {}
+    for name, _, _, _ in solver.PRUNE_SPECS:
+        data = _load(_done_path(checkpoint, name))
+        if data is not None:
+            done[name] = data['dist']
+    data = _load(_partial_path(checkpoint))
+    partial = None
+    if data is not None:
+        partial = (str(data['name']), data['dist'], int(data['depth']))
+    return done, partial
+
+
+def _remove_checkpoint(checkpoint):
+    for path in [_partial_path(checkpoint)] + [
+            _done_path(checkpoint, name) for name, _, _, _ in
+            solver.PRUNE_SPECS]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def default_progress(name, depth, count, seconds):
+    print('%-13s depth %2d: %9d states  %6.2fs' % (name, depth, count,
+                                                  seconds))
+
+
+def build_prune_table(pool_size, move_tables, name, name_a, name_b, start,
+                      partial=None, checkpoint=None,
+                      progress=default_progress):
+    size = len(move_tables[name_a]) * len(move_tables[name_b])
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        dist = np.ndarray(size, dtype=np.int8, buffer=shm.buf)
+        if partial is None:
+            dist[:] = -1
+            dist[start] = 0
+            depth = 0
+        else:
+            dist[:] = partial[1]
+            depth = partial[2]
+
+        # several chunks per worker evens out uneven frontiers
+        chunks = max(1, pool_size * 4)
+        bounds = np.linspace(0, size, chunks + 1).astype(np.int64)
+        saved = time.perf_counter()
+        with Pool(pool_size, _init_worker,
+                  (move_tables, shm.name, size)) as pool:
+            while True:
+                began = time.perf_counter()
+                jobs = [(name_a, name_b, int(lo), int(hi), depth)
+                        for lo, hi in zip(bounds[:-1], bounds[1:])]
+                count = sum(pool.imap_unordered(_expand, jobs))
+                if not count:
+                    break
+                if progress:
+                    progress(name, depth, count, time.perf_counter() - began)
+                depth += 1
+                if (checkpoint and time.perf_counter() - saved >=
+                        CHECKPOINT_INTERVAL):
+                    _save(_partial_path(checkpoint), name=np.array(name),
+                          dist=dist, depth=np.array(depth))
+                    saved = time.perf_counter()
+        return dist.copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def generate(path=solver.default_table_path, workers=None, checkpoint=None,
+             progress=default_progress):
+    ''' build every solver table and write the table file '''
+    workers = workers or os.cpu_count()
+    if checkpoint is None:
+        checkpoint = path + '.checkpoint'
+    done, partial = _load_checkpoint(checkpoint)
+
+    tables = solver.build_move_tables()
+    for name, a, b, start in solver.PRUNE_SPECS:
+        if name in done:
+            tables[name] = done[name]
+            continue
+        resume = partial if partial and partial[0] == name else None
+        tables[name] = build_prune_table(workers, tables, name, a, b, start,
+                                         resume, checkpoint, progress)
+        _save(_done_path(checkpoint, name), dist=tables[name])
+
+    solver.save_tables(tables, path)
+    _remove_checkpoint(checkpoint)
+    return tables
+
+
+def _lock_path(path):
+    return path + '.lock'
+
+
+def _running(lock):
+    try:
+        with open(lock) as file:
+            text = file.read()
+        age = time.time() - os.path.getmtime(lock)
+    except OSError:
+        return False
+    if not text:
+        # just created, the pid follows
+        return age < LOCK_GRACE
+    try:
+        os.kill(int(text), 0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _take_lock(lock):
+    ''' create the lock file atomically, the fd or None if it is held '''
+    for _ in range(2):
+        try:
+            return os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _running(lock):
+                return None
+            # left behind by a build that died
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+    return None
+
+
+def start_background(path=solver.default_table_path, workers=None):
+    '''
+    Start a detached build of the table file unless one is already running.
+    Returns the Popen of the build, or None if another one is running.
+    '''
+    fd = _take_lock(_lock_path(path))
+    if fd is None:
+        return None
+    lock = _lock_path(path)
+    args = [sys.executable, os.path.abspath(__file__), '--output', path,
+            '--quiet']
+    if workers:
+        args += ['--workers', str(workers)]
+    with os.fdopen(fd, 'w') as file:
+        # held by this process until the build has a pid of its own
+        file.write(str(os.getpid()))
+        file.flush()
+        try:
+            process = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.DEVNULL,
+                                       start_new_session=True)
+        except BaseException:
+            file.close()
+            os.remove(lock)
+            raise
+        file.seek(0)
+        file.truncate()
+        file.write(str(process.pid))
+    return process
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the solver tables.')
+    parser.add_argument('--output', default=solver.default_table_path)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    began = time.perf_counter()
+    try:
+        generate(args.output, args.workers, args.checkpoint,
+                 None if args.quiet else default_progress)
+    finally:
+        lock = _lock_path(args.output)
+        try:
+            with open(lock) as file:
+                ours = file.read() == str(os.getpid())
+            if ours:
+                os.remove(lock)
+        except OSError:
+            pass
+    if not args.quiet:
+        print('tables written to %s in %.2fs' %
+              (args.output, time.perf_counter() - began))
+
+
+if __name__ == "__main__":
+    main()
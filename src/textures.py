@@ -0,0 +1,159 @@
+'''
+Lazily loaded, shared textures for the UI pages.
+
+Pages ask for a texture by path when they draw it, so nothing is decoded
+before the first frame and images of pages never shown (help, other
+tutorial steps) are never decoded at all. Every path loads once.
+
+Small icons can be packed into one atlas image. The atlas is written next
+to the icons the first time, with a manifest of what went where, and
+rebuilt when the icons or the list of them change; later starts decode
+that single file with arcade.load_textures instead of one file per icon.
+The atlas is prepared on a background thread while the rest of the
+window is set up; the first texture asked for waits for it, so even on a
+cold start the first page's icons come from the atlas.
+'''
+
+import json
+import os
+import threading
+import time
+
+import arcade
+import PIL.Image
+
+# icons at most this big (both sides) go into the atlas
+ATLAS_MAX_ICON = 128
+ATLAS_WIDTH = 512
+
+
+def atlas_layout(sizes, width=ATLAS_WIDTH):
+    '''
+    Shelf packing of (w, h) sizes: [x, y, w, h] per size, in order, and
+    the (width, height) of the atlas.
+    '''
+    rects = []
+    x = y = shelf = 0
+    for w, h in sizes:
+        if x + w > width:
+            x = 0
+            y += shelf
+            shelf = 0
+        rects.append([x, y, w, h])
+        x += w
+        shelf = max(shelf, h)
+    return rects, (width, y + shelf)
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def build_atlas(paths, atlas_path):
+    '''
+    pack the images into atlas_path unless its manifest (atlas_path +
+    '.json': path, size and mtime of every image, in order) still matches,
+    returns their rects
+    '''
+    sizes = []
+    for path in paths:
+        # opening reads the header only, pixels are decoded on paste
+        with PIL.Image.open(path) as image:
+            sizes.append(image.size)
+    rects, size = atlas_layout(sizes)
+
+    manifest = [[p, w, h, os.path.getmtime(p)]
+                for p, (w, h) in zip(paths, sizes)]
+    manifest_path = atlas_path + '.json'
+    if (not os.path.exists(atlas_path) or
+            _read_manifest(manifest_path) != manifest):
+        atlas = PIL.Image.new('RGBA', size, (0, 0, 0, 0))
+        for path, (x, y, w, h) in zip(paths, rects):
+            with PIL.Image.open(path) as image:
+                atlas.paste(image.convert('RGBA'), (x, y))
+        atlas.save(atlas_path)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file)
+    return rects
+
+
+class TextureManager:
+    ''' Textures by path, loaded on first use. '''
+
+    def __init__(self):
+        self.textures = {}
+        # icon path -> rect in the atlas, for icons not loaded yet
+        self.atlas = {}
+        self.atlas_path = None
+        self.atlas_thread = None
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def use_atlas(self, paths, atlas_path):
+        '''
+        Serve the small images among paths from one atlas file, prepared
+        by a background thread that get() waits for. Images that cannot be
+        read, or all of them if the atlas cannot be written, are simply
+        loaded one by one.
+        '''
+        self.atlas_thread = threading.Thread(
+            target=self._prepare_atlas, args=(list(paths), atlas_path),
+            daemon=True)
+        self.atlas_thread.start()
+
+    def _prepare_atlas(self, paths, atlas_path):
+        small = []
+        for path in dict.fromkeys(paths):
+            try:
+                with PIL.Image.open(path) as image:
+                    w, h = image.size
+            except OSError as e:
+                print('not in the texture atlas:', e)
+                continue
+            if w <= ATLAS_MAX_ICON and h <= ATLAS_MAX_ICON:
+                small.append(path)
+        if not small:
+            return
+        try:
+            rects = build_atlas(small, atlas_path)
+        except OSError as e:
+            print('texture atlas disabled:', e)
+            return
+        # the path first: get() goes by self.atlas alone
+        self.atlas_path = atlas_path
+        self.atlas = dict(zip(small, rects))
+
+    def get(self, path):
+        texture = self.textures.get(path)
+        if texture is None:
+            began = time.perf_counter()
+            if self.atlas_thread is not None:
+                self.atlas_thread.join()
+                self.atlas_thread = None
+            if path in self.atlas:
+                self._load_atlas()
+                texture = self.textures[path]
+            else:
+                texture = self.textures[path] = arcade.load_texture(path)
+                self.loads += 1
+            self.load_seconds += time.perf_counter() - began
+        return texture
+
+    def _load_atlas(self):
+        paths = [p for p in self.atlas if p not in self.textures]
+        loaded = arcade.load_textures(self.atlas_path,
+                                      [self.atlas[p] for p in paths])
+        self.textures.update(zip(paths, loaded))
+        self.atlas = {}
+        self.loads += 1
+
+    def stats(self):
+        return {
+            'textures': len(self.textures),
+            'files_decoded': self.loads,
+            'load_ms': self.load_seconds * 1000,
+        }